@@ -2,22 +2,29 @@ from __future__ import annotations
 import tkinter as tk
 from tkinter import ttk, messagebox, filedialog
 import calendar
+from collections import OrderedDict
 from datetime import date, datetime
 import os
 import platform
 import subprocess
-from database import init_db
+from database import init_db, close_connections
+import instrumentation
 import models
-from utils import show_graph_window, export_csv, export_txt_summary, show_remaining_vs_days
+from worker import BackgroundWorker
+from utils import (CycleHistoryChartPanel, ExpenseChartsPanel, RemainingChartPanel, expense_summary, export_csv,
+                   export_txt_summary, import_expenses, prewarm_charts, release_snapshots)
 
 # --------------------- CONSTANTS ---------------------
 CATEGORIES = ["Mâncare", "Transport", "Utilități", "Chirie", "Divertisment", "Altele"]
+HISTORY_CYCLES = 12  # cicluri de salariu in graficul de istoric
 BG_COLOR = "#E6EEF5"
 CARD_BG = "#FFFFFF"
 CARD_SHADOW = "#D8E0EA"
 ACCENT_BLUE = "#2563EB"
 ACCENT_GREEN = "#10B981"
 TEXT_MUTED = "#6B7280"
+PAGE_SIZE = 200  # randuri aduse dintr-o data din DB pentru tabelele virtuale
+USER_COUNT_CAP = 10 * PAGE_SIZE  # Admin Dashboard: utilizatori numarati cel mult
 
 
 # --------------------- DATE PICKER ---------------------
@@ -87,6 +94,222 @@ class DatePicker(tk.Toplevel):
         self.destroy()
 
 
+# --------------------- VIRTUAL TABLE ---------------------
+class VirtualTable(tk.Frame):
+    """
+    Treeview that keeps only the visible window of rows as items.
+    Rows are pulled from `fetch(offset, limit, after) -> (rows, next_key)` in blocks of
+    `block_size`, on `worker` under the job key `key`; rows of a block still loading are
+    shown as placeholders. At most `max_blocks` blocks stay cached and the same Treeview
+    items are reused (their values are rewritten) while scrolling.
+    """
+
+    PLACEHOLDER = "…"
+
+    def __init__(self, master, columns, widths, to_values, worker, key, on_select=None,
+                 height=16, block_size=PAGE_SIZE, max_blocks=6):
+        super().__init__(master)
+        self.to_values = to_values
+        self.worker = worker
+        self.key = key
+        self.placeholder = (self.PLACEHOLDER,) * len(columns)
+        self.on_select = on_select
+        self.block_size = block_size
+        self.max_blocks = max_blocks
+
+        self.tree = ttk.Treeview(self, columns=columns, show="headings", height=height,
+                                 selectmode="browse")
+        for col, w in zip(columns, widths):
+            self.tree.heading(col, text=col)
+            self.tree.column(col, width=w, anchor="center")
+        self.tree.pack(side="left", fill="both", expand=True)
+        self.sb = ttk.Scrollbar(self, orient="vertical", command=self.on_scrollbar)
+        self.sb.pack(side="right", fill="y")
+
+        self.visible = height
+        self.top = 0
+        self.total = 0
+        self.exact = True
+        self.fetch = None
+        self.source = 0  # crescut de set_source; blocurile unei surse vechi sunt ignorate
+        self.blocks: OrderedDict = OrderedDict()  # block index -> (rows, next_key)
+        self.loading = None  # indexul blocului cerut acum in background
+        self.window: list = []  # randurile afisate acum, in ordinea item-elor (None = inca se incarca)
+        self.selected_row = None
+
+        self.tree.bind("<<TreeviewSelect>>", self._on_tree_select)
+        self.tree.bind("<Configure>", self._on_configure)
+        self.tree.bind("<MouseWheel>", lambda e: self.scroll(-3 if e.delta > 0 else 3))
+        self.tree.bind("<Button-4>", lambda _e: self.scroll(-3))
+        self.tree.bind("<Button-5>", lambda _e: self.scroll(3))
+        self.tree.bind("<Up>", lambda _e: self._on_arrow(-1))
+        self.tree.bind("<Down>", lambda _e: self._on_arrow(1))
+        self.tree.bind("<Prior>", lambda _e: self.scroll(-self.visible) or "break")
+        self.tree.bind("<Next>", lambda _e: self.scroll(self.visible) or "break")
+
+    # ----- data source -----
+    def set_source(self, total: int, fetch, first_block=None, exact: bool = True) -> None:
+        """
+        `first_block` = (rows, next_key) for offset 0, if already fetched (e.g. in background).
+        exact=False: `total` is only a lower bound (a capped count); it grows as blocks arrive
+        and becomes exact at the block whose next_key is None.
+        """
+        self.total, self.fetch, self.exact = total, fetch, exact
+        self.source += 1
+        self.blocks.clear()
+        if self.loading is not None:
+            self.worker.cancel(self.key)
+            self.loading = None
+        if first_block is not None:
+            self.blocks[0] = first_block
+            self._grow(0, first_block)
+        self.top = 0
+        self.selected_row = None
+        self.render()
+
+    def _block(self, b: int):
+        """The rows of block `b`, or None after asking the worker for it (render() runs again when it arrives)."""
+        if b in self.blocks:
+            self.blocks.move_to_end(b)
+            return self.blocks[b][0]
+        if self.loading != b:
+            # o cerere noua o inlocuieste (si o intrerupe) pe cea pentru un bloc deja iesit din fereastra
+            self.loading = b
+            prev = self.blocks.get(b - 1)
+            if prev and prev[1] is not None:
+                args = (None, self.block_size, prev[1])
+            else:
+                args = (b * self.block_size, self.block_size, None)
+            source = self.source
+            self.worker.submit(self.key, self.fetch, *args,
+                               on_done=lambda res: self._block_loaded(source, b, res),
+                               on_error=lambda e: self._block_failed(source, b, e))
+        return None
+
+    def _block_loaded(self, source: int, b: int, block) -> None:
+        if source != self.source:
+            return
+        self.loading = None
+        self.blocks[b] = block
+        while len(self.blocks) > self.max_blocks:
+            self.blocks.popitem(last=False)
+        self._grow(b, block)
+        self.render()
+
+    def _grow(self, b: int, block) -> None:
+        if self.exact:
+            return
+        rows, next_key = block
+        end = b * self.block_size + len(rows)
+        if next_key is None:
+            self.total, self.exact = end, True
+        elif end >= self.total:
+            self.total = end + self.block_size  # mai sunt randuri; blocul urmator fixeaza restul
+
+    def _block_failed(self, source: int, b: int, e: BaseException) -> None:
+        if source == self.source and self.loading == b:
+            self.loading = None
+            messagebox.showerror("Error", str(e))
+
+    def _rows(self, start: int, count: int) -> list:
+        out = []
+        pos, end = start, min(start + count, self.total)
+        while pos < end:
+            b, i = divmod(pos, self.block_size)
+            rows = self._block(b)
+            if rows is None:
+                out.extend([None] * (end - pos))  # restul ferestrei apare dupa incarcare
+                break
+            chunk = rows[i:i + (end - pos)]
+            if not chunk:  # datele s-au micsorat intre timp
+                break
+            out.extend(chunk)
+            pos += len(chunk)
+        return out
+
+    # ----- rendering -----
+    def render(self) -> None:
+        self.top = max(0, min(self.top, self.total - self.visible))
+        self.window = self._rows(self.top, self.visible) if self.fetch else []
+        items = list(self.tree.get_children())
+        while len(items) < len(self.window):
+            items.append(self.tree.insert("", "end"))
+        while len(items) > len(self.window):
+            self.tree.delete(items.pop())
+
+        selected_iid = None
+        selected_id = self.selected_row[0] if self.selected_row else None
+        for iid, row in zip(items, self.window):
+            if row is None:
+                self.tree.item(iid, values=self.placeholder)
+                continue
+            self.tree.item(iid, values=self.to_values(row))
+            if row[0] == selected_id:
+                selected_iid = iid
+        if selected_iid:
+            self.tree.selection_set(selected_iid)
+        elif self.tree.selection():
+            self.tree.selection_remove(*self.tree.selection())
+
+        if self.total > 0:
+            self.sb.set(self.top / self.total, min(1.0, (self.top + self.visible) / self.total))
+        else:
+            self.sb.set(0.0, 1.0)
+
+    def scroll(self, delta: int) -> None:
+        self.top += delta
+        self.render()
+
+    def on_scrollbar(self, action, value, unit=None):
+        if action == "moveto":
+            self.top = int(float(value) * self.total)
+        elif action == "scroll":
+            step = self.visible if unit == "pages" else 1
+            self.top += int(value) * step
+        self.render()
+
+    # ----- events -----
+    def _on_tree_select(self, _event):
+        sel = self.tree.selection()
+        idx = self.tree.index(sel[0]) if sel else -1
+        if not 0 <= idx < len(self.window):
+            return
+        row = self.window[idx]
+        if row is None:  # rand inca in incarcare
+            return
+        # re-selectarea aceluiasi rand dupa scroll nu notifica din nou
+        if self.selected_row and self.selected_row[0] == row[0]:
+            return
+        self.selected_row = row
+        if self.on_select:
+            self.on_select(row)
+
+    def _on_configure(self, event):
+        items = self.tree.get_children()
+        bbox = self.tree.bbox(items[0]) if items else None
+        if not bbox:
+            return
+        header, row_h = bbox[1], bbox[3]
+        visible = max(1, (event.height - header) // max(1, row_h))
+        if visible != self.visible:
+            self.visible = visible
+            self.render()
+
+    def _on_arrow(self, step: int):
+        items = self.tree.get_children()
+        focus = self.tree.focus()
+        if not items or focus not in items:
+            return None
+        idx = items.index(focus) + step
+        if 0 <= idx < len(items):
+            return None  # lasam Treeview sa mute selectia in fereastra curenta
+        self.scroll(step)
+        edge = self.tree.get_children()[0 if step < 0 else -1]
+        self.tree.focus(edge)
+        self.tree.selection_set(edge)
+        return "break"
+
+
 # --------------------- MAIN APP ---------------------
 class ExpenseApp:
     def __init__(self, root: tk.Tk):
@@ -94,6 +317,8 @@ class ExpenseApp:
         self.root.title("Expense Tracker")
         self.root.geometry("1100x750")
         self.root.configure(bg=BG_COLOR)
+        # latente per operatie + interogari lente, vizibile in Admin Dashboard -> Stats
+        instrumentation.enable()
         init_db()
         models.ensure_default_admin()
 
@@ -111,6 +336,16 @@ class ExpenseApp:
         self.filter_from_var = tk.StringVar(value="")
         self.filter_to_var = tk.StringVar(value="")
 
+        # background jobs (DB / export) + busy indicator
+        self.busy_var = tk.StringVar(value="")
+        self.worker = BackgroundWorker(self.root, on_busy=self.set_busy)
+
+        # chart tabs (create on first use, reused after)
+        self.charts_panel = None
+        self.remaining_panel = None
+        self.history_panel = None
+
+        self.root.protocol("WM_DELETE_WINDOW", self.on_close)
         self.show_login()
 
     # ---------- helpers ----------
@@ -141,6 +376,10 @@ class ExpenseApp:
         b = int(hex_color[4:6], 16)
         return f"#{int(r*factor):02x}{int(g*factor):02x}{int(b*factor):02x}"
 
+    def set_busy(self, busy: bool):
+        self.busy_var.set("⏳ Working…" if busy else "")
+        self.root.config(cursor="watch" if busy else "")
+
     def make_colored_button(self, parent, text, bg, command):
         btn = tk.Label(parent, text=text, bg=bg, fg="white", padx=16, pady=8, cursor="hand2")
         btn.bind("<Button-1>", lambda _e: command())
@@ -220,24 +459,28 @@ class ExpenseApp:
             back.bind("<Button-1>", lambda _e: self.show_login())
 
     def on_login(self):
-        res = models.authenticate_user(self.login_email.get(), self.login_password.get())
+        self.worker.submit("login", models.authenticate_user,
+                           self.login_email.get(), self.login_password.get(), on_done=self.on_login_done)
+
+    def on_login_done(self, res):
         if not res:
             messagebox.showerror("Login failed", "Invalid email or password.")
             return
         uid, is_admin = res
         self.current_user_id, self.current_is_admin = uid, is_admin
+        prewarm_charts()
         if is_admin:
             self.show_admin_dashboard()
         else:
             self.show_main()
 
     def on_register(self):
-        try:
-            models.create_user(self.reg_email.get(), self.reg_password.get())
+        def on_done(_res):
             messagebox.showinfo("Success", "Account created. Please login.")
             self.show_login()
-        except Exception as e:
-            messagebox.showerror("Error", str(e))
+
+        self.worker.submit(None, models.create_user, self.reg_email.get(), self.reg_password.get(),
+                           on_done=on_done, interruptible=False)
 
     def open_reset_password(self):
         win = tk.Toplevel(self.root)
@@ -246,15 +489,18 @@ class ExpenseApp:
         email_entry = tk.Entry(win, width=40)
         email_entry.pack(padx=10, pady=(0, 10))
 
-        def do_reset():
-            tmp = models.reset_password_local(email_entry.get())
+        def on_done(tmp):
             if not tmp:
-                messagebox.showerror("Not found", "No account found for this e-mail.")
+                messagebox.showerror("Not found", "No account found for this e-mail.", parent=win)
                 return
             messagebox.showinfo("Temporary password",
                                 f"A temporary password has been set:\n\n{tmp}\n\nUse it to log in.")
             win.destroy()
 
+        def do_reset():
+            self.worker.submit(None, models.reset_password_local, email_entry.get(),
+                               on_done=on_done, interruptible=False)
+
         tk.Button(win, text="Generate new password", command=do_reset).pack(pady=(0, 10))
 
     # ---------- MAIN (user) ----------
@@ -267,15 +513,21 @@ class ExpenseApp:
         top.pack(fill="x", pady=8, padx=10)
         tk.Label(top, text=f"Logged in (user_id={self.current_user_id})").pack(side="left")
         tk.Button(top, text="Logout", command=self.logout).pack(side="right")
+        self.status_var = tk.StringVar(value="")
+        tk.Label(top, textvariable=self.busy_var, fg=TEXT_MUTED).pack(side="right", padx=10)
+        tk.Label(top, textvariable=self.status_var, fg=TEXT_MUTED).pack(side="right", padx=10)
 
         # ===== Budget panel =====
         budget = tk.LabelFrame(self.root, text="Budget")
         budget.pack(fill="x", padx=10, pady=(0, 8))
 
-        # load settings
-        payday, monthly_budget = models.get_user_settings(self.current_user_id)
-        self.payday_var.set(payday)
-        self.budget_var.set(f"{monthly_budget:.2f}")
+        # load settings (pe worker: prima citire poate scrie randul implicit)
+        def show_settings(settings):
+            payday, monthly_budget = settings
+            self.payday_var.set(payday)
+            self.budget_var.set(f"{monthly_budget:.2f}")
+
+        self.worker.submit("settings", models.get_user_settings, self.current_user_id, on_done=show_settings)
 
         tk.Label(budget, text="Payday (1–31)").grid(row=0, column=0, padx=6, pady=6, sticky="e")
         self.payday_cb = ttk.Combobox(budget, values=[str(i) for i in range(1, 32)],
@@ -296,6 +548,7 @@ class ExpenseApp:
         self.cycle_label.grid(row=0, column=6, padx=12, sticky="w")
 
         tk.Button(budget, text="📈 Remaining vs Days", command=self.open_remaining_chart).grid(row=0, column=7, padx=10)
+        tk.Button(budget, text="📅 Cycle history", command=self.open_history_chart).grid(row=0, column=8, padx=(0, 10))
 
         # form
         form = tk.LabelFrame(self.root, text="Expense")
@@ -325,6 +578,7 @@ class ExpenseApp:
         tk.Button(btns, text="Delete", command=self.delete_expense_ui).pack(side="left", padx=4)
         tk.Button(btns, text="📊 Graphs", command=self.show_charts).pack(side="left", padx=4)
         tk.Button(btns, text="💾 Export report", command=self.export_report).pack(side="left", padx=4)
+        tk.Button(btns, text="📥 Import", command=self.import_report).pack(side="left", padx=4)
 
         # ===== Filters / Sort (cu From/To + date pickers) =====
         filt = tk.LabelFrame(self.root, text="Filters / Sort")
@@ -336,7 +590,7 @@ class ExpenseApp:
         self.filter_cat.set("All")
 
         tk.Label(filt, text="Sort by").grid(row=0, column=2)
-        self.sort_by = ttk.Combobox(filt, values=["date", "amount", "category"], state="readonly", width=12)
+        self.sort_by = ttk.Combobox(filt, values=["date", "amount", "category", "relevance"], state="readonly", width=12)
         self.sort_by.grid(row=0, column=3, padx=(0, 8))
         self.sort_by.set("date")
 
@@ -358,25 +612,54 @@ class ExpenseApp:
 
         tk.Button(filt, text="Apply", command=self.apply_filters).grid(row=0, column=12, padx=(6, 0))
 
+        # cautare in descrieri (FTS5): cuvinte = prefix, "text intre ghilimele" = fraza exacta
+        tk.Label(filt, text="Search").grid(row=1, column=0, pady=(4, 0))
+        self.filter_search = tk.Entry(filt, width=40)
+        self.filter_search.grid(row=1, column=1, columnspan=5, sticky="w", pady=(4, 0))
+        self.filter_search.bind("<Return>", lambda _e: self.apply_filters())
+
         # table
-        table_frame = tk.Frame(self.root)
-        table_frame.pack(fill="both", expand=True, padx=10, pady=8)
-        self.tree = ttk.Treeview(table_frame, columns=("ID", "Amount", "Category", "Date", "Description"),
-                                 show="headings", height=16)
-        for col, w in (("ID", 50), ("Amount", 100), ("Category", 160), ("Date", 110), ("Description", 460)):
-            self.tree.heading(col, text=col)
-            self.tree.column(col, width=w, anchor="center")
-        self.tree.pack(side="left", fill="both", expand=True)
-        sb = ttk.Scrollbar(table_frame, orient="vertical", command=self.tree.yview)
-        self.tree.configure(yscroll=sb.set)
-        sb.pack(side="right", fill="y")
-        self.tree.bind("<<TreeviewSelect>>", self.on_row_select)
+        # table + chart panels as tabs; chart tabs are created on first use and then reused
+        self.tabs = ttk.Notebook(self.root)
+        self.tabs.pack(fill="both", expand=True, padx=10, pady=8)
+        self.charts_panel = None
+        self.remaining_panel = None
+        self.history_panel = None
+        table_frame = tk.Frame(self.tabs)
+        self.tabs.add(table_frame, text="Expenses")
+        self.table = VirtualTable(
+            table_frame,
+            columns=("ID", "Amount", "Category", "Date", "Description"),
+            widths=(50, 100, 160, 110, 460),
+            to_values=lambda r: (r[0], r[2], r[3], r[4], r[5]),
+            worker=self.worker,
+            key="expense_rows",
+            on_select=self.on_row_select,
+        )
+        self.table.pack(fill="both", expand=True)
         self.refresh_table()
         self.refresh_budget_badge()  # initial compute
 
     # ---------- Budget logic ----------
     def open_remaining_chart(self):
-        show_remaining_vs_days(self.root, self.current_user_id)
+        if self.remaining_panel is None:
+            self.remaining_panel = RemainingChartPanel(self.tabs)
+            self.tabs.add(self.remaining_panel, text="📈 Remaining vs Days")
+        self.tabs.select(self.remaining_panel)
+        self.worker.submit("remaining_chart", models.get_cycle_remaining, self.current_user_id,
+                           on_done=self.remaining_panel.show_cycle)
+
+    def open_history_chart(self):
+        if self.history_panel is None:
+            self.history_panel = CycleHistoryChartPanel(self.tabs)
+            self.tabs.add(self.history_panel, text="📅 Cycle history")
+        self.tabs.select(self.history_panel)
+        self.refresh_history_chart()
+
+    def refresh_history_chart(self):
+        if self.history_panel is not None:
+            self.worker.submit("history_chart", models.get_cycle_history, self.current_user_id, HISTORY_CYCLES,
+                               on_done=self.history_panel.show_history)
 
     def save_budget(self):
         try:
@@ -385,12 +668,22 @@ class ExpenseApp:
         except ValueError:
             messagebox.showerror("Error", "Invalid budget value.")
             return
-        models.update_user_settings(self.current_user_id, payday, budget)
-        self.refresh_budget_badge()
-        messagebox.showinfo("Saved", "Budget settings saved.")
+        def on_done(_res):
+            self.refresh_budget_badge()
+            messagebox.showinfo("Saved", "Budget settings saved.")
+
+        self.worker.submit(None, models.update_user_settings, self.current_user_id, payday, budget,
+                           on_done=on_done, interruptible=False)
 
     def refresh_budget_badge(self):
-        remaining, spent, start, end = models.get_cycle_remaining(self.current_user_id)
+        self.worker.submit("badge", models.get_cycle_remaining, self.current_user_id,
+                           on_done=self.show_budget_badge)
+        self.refresh_history_chart()
+
+    def show_budget_badge(self, result):
+        if self.remaining_panel is not None:
+            self.remaining_panel.show_cycle(result)
+        remaining, spent, start, end = result
         self.remaining_var.set(f"Remaining amount: {remaining:.2f} RON (spent {spent:.2f})")
         self.cycle_range_var.set(f"{start.isoformat()} → {end.isoformat()}")
 
@@ -425,9 +718,24 @@ class ExpenseApp:
         else:
             txt_path = file_path + ".txt"
 
-        export_csv(self.current_user_id, file_path, dfrom, dto)
-        export_txt_summary(self.current_user_id, txt_path, dfrom, dto)
+        uid = self.current_user_id
 
+        def on_progress(done, total):
+            self.worker.post(self.status_var.set, f"Exporting… {done}/{total} rows")
+
+        def job():
+            export_csv(uid, file_path, dfrom, dto, progress=on_progress)
+            export_txt_summary(uid, txt_path, dfrom, dto)
+
+        def on_error(e):
+            self.status_var.set("")
+            messagebox.showerror("Export failed", str(e))
+
+        self.worker.submit("export", job, on_done=lambda _r: self.export_done(file_path, txt_path),
+                           on_error=on_error, interruptible=False)
+
+    def export_done(self, file_path: str, txt_path: str) -> None:
+        self.status_var.set("")
         # deschide automat
         try:
             if platform.system() == "Darwin":
@@ -444,6 +752,31 @@ class ExpenseApp:
 
         messagebox.showinfo("Export done", f"Saved:\n\n• {file_path}\n• {txt_path}")
 
+    # ---------- IMPORT ----------
+    def import_report(self) -> None:
+        file_path = filedialog.askopenfilename(
+            title="Import expenses from...",
+            filetypes=[("CSV file", "*.csv"), ("JSON lines", "*.jsonl"), ("All files", "*.*")]
+        )
+        if not file_path:
+            return
+
+        def on_progress(done):
+            self.worker.post(self.status_var.set, f"Importing… {done} rows")
+
+        def on_done(count):
+            self.status_var.set("")
+            self.refresh_table()
+            self.refresh_budget_badge()
+            messagebox.showinfo("Import done", f"Imported {count} expenses.")
+
+        def on_error(e):
+            self.status_var.set("")
+            messagebox.showerror("Import failed", str(e))
+
+        self.worker.submit("import", import_expenses, self.current_user_id, file_path,
+                           progress=on_progress, on_done=on_done, on_error=on_error, interruptible=False)
+
     # ---------- Date pickers ----------
     def open_datepicker_main(self):
         DatePicker(
@@ -481,13 +814,11 @@ class ExpenseApp:
         if not self.valid_date_str(date_str):
             messagebox.showerror("Error", "Invalid date format (YYYY-MM-DD).")
             return
-        models.add_expense(self.current_user_id, amount, category, date_str, desc)
-        self.refresh_table()
-        self.refresh_budget_badge()
+        self._write_expense(models.add_expense, self.current_user_id, amount, category, date_str, desc)
 
     def update_expense_ui(self):
-        sel = self.tree.selection()
-        if not sel:
+        row = self.table.selected_row
+        if not row:
             messagebox.showwarning("Select", "Select a row to update.")
             return
         try:
@@ -499,33 +830,34 @@ class ExpenseApp:
         if not self.valid_date_str(date_str):
             messagebox.showerror("Error", "Invalid date format (YYYY-MM-DD).")
             return
-        exp_id = int(self.tree.item(sel[0], "values")[0])
-        models.update_expense(exp_id, self.current_user_id, amount, category, date_str, desc)
-        self.refresh_table()
-        self.refresh_budget_badge()
+        exp_id = row[0]
+        self._write_expense(models.update_expense, exp_id, self.current_user_id, amount, category, date_str, desc)
 
     def delete_expense_ui(self):
-        sel = self.tree.selection()
-        if not sel:
+        row = self.table.selected_row
+        if not row:
             messagebox.showwarning("Select", "Select a row to delete.")
             return
-        exp_id = int(self.tree.item(sel[0], "values")[0])
+        exp_id = row[0]
         if messagebox.askyesno("Confirm", "Are you sure you want to delete this expense?"):
-            models.delete_expense(exp_id, self.current_user_id)
+            self._write_expense(models.delete_expense, exp_id, self.current_user_id)
+
+    def _write_expense(self, fn, *args):
+        # scrierile ruleaza pe worker: cu baza blocata, retry_on_busy poate astepta zeci de secunde
+        def on_done(_res):
             self.refresh_table()
             self.refresh_budget_badge()
 
-    def on_row_select(self, _event):
-        sel = self.tree.selection()
-        if not sel:
-            return
-        vals = self.tree.item(sel[0], "values")
+        self.worker.submit(None, fn, *args, on_done=on_done, interruptible=False)
+
+    def on_row_select(self, row):
+        # row: (id, user_id, amount, category, date, description)
         self.amount_entry.delete(0, tk.END)
-        self.amount_entry.insert(0, vals[1])
-        self.category_cb.set(vals[2])
-        self.date_var.set(vals[3])
+        self.amount_entry.insert(0, row[2])
+        self.category_cb.set(row[3])
+        self.date_var.set(row[4])
         self.desc_entry.delete(0, tk.END)
-        self.desc_entry.insert(0, vals[4])
+        self.desc_entry.insert(0, row[5] or "")
 
     # ---------- Filters / Sort ----------
     def apply_filters(self):
@@ -535,6 +867,7 @@ class ExpenseApp:
 
         dfrom = self.filter_from_var.get().strip()
         dto = self.filter_to_var.get().strip()
+        search = self.filter_search.get().strip()
 
         # validari (daca sunt completate)
         if dfrom and not self.valid_date_str(dfrom):
@@ -547,42 +880,50 @@ class ExpenseApp:
             messagebox.showerror("Error", "From date cannot be after To date.")
             return
 
-        rows = models.get_all_expenses(self.current_user_id)
+        self.load_expenses(
+            category=None if cat == "All" else cat,
+            from_date=dfrom or None,
+            to_date=dto or None,
+            sort_field=sort_field,
+            order=order,
+            search=search or None,
+        )
 
-        # category
-        if cat != "All":
-            rows = [r for r in rows if r[3] == cat]
+    def refresh_table(self):
+        self.load_expenses()
+        self.refresh_charts()
 
-        # date range (r[4] este YYYY-MM-DD, deci compararea funcționeaza)
-        if dfrom:
-            rows = [r for r in rows if r[4] >= dfrom]
-        if dto:
-            rows = [r for r in rows if r[4] <= dto]
+    def load_expenses(self, category=None, from_date=None, to_date=None, sort_field="date", order="DESC", search=None):
+        """
+        Point the table at a new query; filters/sort run in SQL, rows load as they scroll into view.
+        The count and first block are fetched in the background; a newer Apply supersedes this one.
+        """
+        uid = self.current_user_id
 
-        # sorting
-        index_map = {"date": 4, "amount": 2, "category": 3}
-        idx = index_map[sort_field]
-        if sort_field == "amount":
-            rows.sort(key=lambda r: float(r[idx]), reverse=(order == "DESC"))
-        else:
-            rows.sort(key=lambda r: r[idx], reverse=(order == "DESC"))
+        def fetch(offset, limit, after):
+            return models.query_expenses(uid, category, from_date, to_date, sort_field, order,
+                                         limit=limit, after=after, offset=offset or 0, search=search)
 
-        # populate table
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        for r in rows:
-            self.tree.insert("", "end", values=(r[0], r[2], r[3], r[4], r[5]))
+        def job():
+            return (models.count_expenses(uid, category, from_date, to_date, search),
+                    fetch(0, self.table.block_size, None))
 
-    def refresh_table(self):
-        for i in self.tree.get_children():
-            self.tree.delete(i)
-        rows = models.get_all_expenses(self.current_user_id)
-        for r in rows:
-            self.tree.insert("", "end", values=(r[0], r[2], r[3], r[4], r[5]))
+        self.worker.submit("expenses", job,
+                           on_done=lambda res: self.table.set_source(res[0], fetch, first_block=res[1]))
 
     # ---------- Charts ----------
     def show_charts(self):
-        show_graph_window(self.root, self.current_user_id, None, None)
+        if self.charts_panel is None:
+            self.charts_panel = ExpenseChartsPanel(self.tabs)
+            self.tabs.add(self.charts_panel, text="📊 Graphs")
+        self.tabs.select(self.charts_panel)
+        self.refresh_charts()
+
+    def refresh_charts(self):
+        if self.charts_panel is None:
+            return
+        self.worker.submit("charts", expense_summary, self.current_user_id, None, None,
+                           include_daily=True, on_done=self.charts_panel.show_summary)
 
     # ---------- Admin ----------
     def show_admin_dashboard(self) -> None:
@@ -594,50 +935,160 @@ class ExpenseApp:
         tk.Label(top, text=f"Admin Dashboard (user_id={self.current_user_id})",
                  font=("Arial", 12, "bold")).pack(side="left")
         tk.Button(top, text="Logout", command=self.logout).pack(side="right")
+        tk.Label(top, textvariable=self.busy_var, fg=TEXT_MUTED).pack(side="right", padx=10)
+
+        search = tk.Frame(self.root)
+        search.pack(fill="x", padx=10)
+        tk.Label(search, text="Email starts with").pack(side="left")
+        self.user_search_var = tk.StringVar(value="")
+        search_entry = tk.Entry(search, textvariable=self.user_search_var, width=30)
+        search_entry.pack(side="left", padx=6)
+        search_entry.bind("<Return>", lambda _e: self.refresh_users())
+        self.admins_only_var = tk.BooleanVar(value=False)
+        tk.Checkbutton(search, text="Admins only", variable=self.admins_only_var,
+                       command=self.refresh_users).pack(side="left", padx=6)
+        tk.Button(search, text="Search", command=self.refresh_users).pack(side="left")
 
         lf = tk.LabelFrame(self.root, text="All Users")
         lf.pack(fill="both", expand=True, padx=10, pady=8)
-        cols = ("ID", "Email", "Created At", "Admin")
-        self.users_tree = ttk.Treeview(lf, columns=cols, show="headings", height=18)
-        for col, w in (("ID", 60), ("Email", 320), ("Created At", 220), ("Admin", 80)):
-            self.users_tree.heading(col, text=col)
-            self.users_tree.column(col, width=w, anchor="center")
-        self.users_tree.pack(side="left", fill="both", expand=True)
-        sb = ttk.Scrollbar(lf, orient="vertical", command=self.users_tree.yview)
-        self.users_tree.configure(yscroll=sb.set)
-        sb.pack(side="right", fill="y")
+        self.users_table = VirtualTable(
+            lf,
+            columns=("ID", "Email", "Created At", "Admin", "Expenses", "Total spent", "Last activity"),
+            widths=(60, 280, 180, 60, 80, 110, 110),
+            to_values=lambda r: (r[0], r[1], r[2] or "-", "Yes" if r[3] else "No", r[4], f"{r[5]:.2f}", r[6] or "-"),
+            worker=self.worker,
+            key="user_rows",
+            height=18,
+        )
+        self.users_table.pack(fill="both", expand=True)
 
         act = tk.Frame(self.root)
         act.pack(fill="x", padx=10, pady=6)
         tk.Button(act, text="Refresh", command=self.refresh_users).pack(side="left")
         tk.Button(act, text="Promote to Admin", command=self.promote_selected_user).pack(side="left", padx=6)
+        tk.Button(act, text="📈 Stats", command=self.open_stats_window).pack(side="right")
 
         self.refresh_users()
 
     def refresh_users(self) -> None:
-        for i in getattr(self, "users_tree").get_children():
-            self.users_tree.delete(i)
-        for uid, email, _hash, created, is_admin in models.list_users():
-            self.users_tree.insert("", "end", values=(uid, email, created or "-", "Yes" if is_admin else "No"))
+        search, admins_only = self.user_search_var.get().strip(), self.admins_only_var.get()
+
+        def fetch(offset, limit, after):
+            return models.list_user_directory(search, admins_only, limit=limit, after=after, offset=offset or 0)
+
+        # numaratoarea se opreste la USER_COUNT_CAP (cost constant); peste ea, totalul creste la scroll
+        self.worker.submit("users", lambda: (models.count_user_directory(search, admins_only, limit=USER_COUNT_CAP + 1),
+                                             fetch(0, self.users_table.block_size, None)),
+                           on_done=lambda res: self.users_table.set_source(
+                               min(res[0], USER_COUNT_CAP), fetch, first_block=res[1], exact=res[0] <= USER_COUNT_CAP))
 
     def promote_selected_user(self) -> None:
-        sel = self.users_tree.selection()
-        if not sel:
+        row = self.users_table.selected_row
+        if not row:
             messagebox.showwarning("Select", "Select a user to promote.")
             return
-        vals = self.users_tree.item(sel[0], "values")
-        uid, email = int(vals[0]), vals[1]
+        uid, email = row[0], row[1]
         if messagebox.askyesno("Confirm", f"Promote {email} to admin?"):
-            models.promote_user_to_admin(uid)
-            self.refresh_users()
-            messagebox.showinfo("Done", f"{email} is now admin.")
+            def on_done(_res):
+                self.refresh_users()
+                messagebox.showinfo("Done", f"{email} is now admin.")
+
+            self.worker.submit(None, models.promote_user_to_admin, uid, on_done=on_done, interruptible=False)
+
+    # ---------- Stats (instrumentation) ----------
+    def open_stats_window(self) -> None:
+        win = tk.Toplevel(self.root)
+        win.title("Stats")
+        win.geometry("1000x640")
+
+        ops_frame = tk.LabelFrame(win, text="Operations (latency in ms, percentiles over the last calls)")
+        ops_frame.pack(fill="both", expand=True, padx=10, pady=(10, 4))
+        op_cols = ("Operation", "Count", "p50", "p95", "p99", "Max", "Total")
+        ops_tree = ttk.Treeview(ops_frame, columns=op_cols, show="headings", height=12)
+        for col, width in zip(op_cols, (520, 70, 70, 70, 70, 70, 90)):
+            ops_tree.heading(col, text=col)
+            ops_tree.column(col, width=width, anchor="w" if col == "Operation" else "e")
+        ops_tree.pack(fill="both", expand=True)
+
+        slow_frame = tk.LabelFrame(win, text="Slow queries")
+        slow_frame.pack(fill="both", expand=True, padx=10, pady=4)
+        slow_cols = ("When", "ms", "SQL")
+        slow_tree = ttk.Treeview(slow_frame, columns=slow_cols, show="headings", height=6)
+        for col, width in zip(slow_cols, (150, 80, 740)):
+            slow_tree.heading(col, text=col)
+            slow_tree.column(col, width=width, anchor="e" if col == "ms" else "w")
+        slow_tree.pack(fill="both", expand=True)
+        plan_text = tk.Text(slow_frame, height=4, wrap="word")
+        plan_text.pack(fill="x", pady=(4, 0))
+
+        slow_entries: list = []
+
+        def show_plan(_event=None):
+            sel = slow_tree.selection()
+            plan_text.delete("1.0", tk.END)
+            if sel:
+                entry = slow_entries[slow_tree.index(sel[0])]
+                plan_text.insert("1.0", "\n".join(entry["plan"]) or "(no query plan)")
+
+        def fill(rep):
+            slow_frame.configure(text=f"Slow queries (≥ {rep['slow_ms']:g} ms, select one for its query plan)")
+            ops_tree.delete(*ops_tree.get_children())
+            for name, st in rep["operations"].items():
+                ops_tree.insert("", tk.END, values=(name, st["count"], f"{st['p50_ms']:.2f}", f"{st['p95_ms']:.2f}",
+                                                     f"{st['p99_ms']:.2f}", f"{st['max_ms']:.2f}", f"{st['total_ms']:.1f}"))
+            slow_tree.delete(*slow_tree.get_children())
+            slow_entries[:] = rep["slow_queries"]
+            for entry in slow_entries:
+                slow_tree.insert("", tk.END, values=(entry["at"], f"{entry['ms']:.1f}", entry["sql"]))
+            show_plan()
+
+        def refresh():
+            self.worker.submit("stats", instrumentation.report, on_done=fill)
+
+        def reset():
+            instrumentation.reset()
+            refresh()
+
+        def save_json():
+            path = filedialog.asksaveasfilename(parent=win, defaultextension=".json",
+                                                filetypes=[("JSON", "*.json")], initialfile="stats.json")
+            if path:
+                self.worker.submit("stats_dump", instrumentation.dump_json, path, interruptible=False,
+                                   on_done=lambda _r: messagebox.showinfo("Saved", path, parent=win))
+
+        slow_tree.bind("<<TreeviewSelect>>", show_plan)
+        btns = tk.Frame(win)
+        btns.pack(fill="x", padx=10, pady=(4, 10))
+        tk.Button(btns, text="Refresh", command=refresh).pack(side="left")
+        tk.Button(btns, text="Reset", command=reset).pack(side="left", padx=6)
+        tk.Button(btns, text="💾 Save JSON", command=save_json).pack(side="left")
+        refresh()
 
     # ---------- misc ----------
+    def _writes_pending(self) -> bool:
+        # importuri, exporturi si scrieri nu se intrerup: le lasam sa termine (si sa-si arate erorile)
+        if self.worker.has_uninterruptible():
+            messagebox.showwarning("Please wait", "An import, export or save is still running.")
+            return True
+        return False
+
     def logout(self):
+        if self._writes_pending():
+            return
+        self.worker.cancel_all()
         self.current_user_id = None
         self.current_is_admin = 0
+        release_snapshots()
+        close_connections()
         self.show_login()
 
+    def on_close(self):
+        if self._writes_pending():
+            return
+        self.worker.shutdown()
+        close_connections()
+        self.root.destroy()
+
 
 if __name__ == "__main__":
     root = tk.Tk()
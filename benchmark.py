@@ -0,0 +1,243 @@
+"""
+Benchmark pe date sintetice, reproductibile (acelasi seed -> aceeasi baza de date, aceleasi interogari).
+
+    python benchmark.py                          # 10k, 100k si 1M randuri, JSON la stdout
+    python benchmark.py --rows 10k,100k --users 20 --repeat 7 --out bench.json
+    python benchmark.py --rows 100k --compare bench.json   # raportul median nou / vechi per operatie
+
+Bazele generate stau in bench/ si sunt refolosite intre rulari (--regenerate le reface);
+expenses.db nu este atins.
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import platform
+import random
+import sqlite3
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+from typing import Callable, Dict, Iterator, Tuple
+
+import database
+import instrumentation
+import models
+import utils
+
+REF_DATE = date(2025, 6, 30)  # "azi" pentru date si cicluri, ca rezultatele sa nu depinda de ziua rularii
+DAYS = 730  # istoricul generat: ultimii 2 ani pana la REF_DATE
+PASSWORD = "bench-password"
+BENCH_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bench")
+
+# categorie -> (pondere, mu, sigma pentru suma log-normala in RON, descrieri)
+PROFILE = {
+    "Mâncare": (0.42, 3.3, 0.7, ["Lidl", "Kaufland", "Mega Image", "cantina", "piata", "pizza"]),
+    "Transport": (0.20, 2.6, 0.6, ["bilet tren", "Bolt", "benzina", "abonament STB", "parcare"]),
+    "Divertisment": (0.12, 3.5, 0.8, ["netflix", "spotify premium", "cinema", "concert", "carti"]),
+    "Utilități": (0.08, 4.9, 0.4, ["curent", "gaz", "internet", "telefon", "apa"]),
+    "Altele": (0.16, 3.7, 1.0, ["farmacie", "haine", "cadou", "service auto", "sala"]),
+    "Chirie": (0.02, 7.4, 0.1, ["chirie"]),
+}
+
+
+def parse_size(text: str) -> int:
+    """'10k' -> 10000, '1M' -> 1000000, '2500' -> 2500."""
+    text = text.strip().lower()
+    mult = {"k": 1_000, "m": 1_000_000}.get(text[-1:], 1)
+    return int(float(text[:-1] if mult > 1 else text) * mult)
+
+
+def _user_email(i: int) -> str:
+    return f"bench{i}@example.com"
+
+
+def generate_rows(seed: int, user_index: int, count: int) -> Iterator[Tuple[float, str, str, str]]:
+    """Deterministic (amount, category, date, description) rows for one user, denser towards REF_DATE."""
+    rng = random.Random(f"{seed}:{user_index}")
+    cats = list(PROFILE)
+    weights = [PROFILE[c][0] for c in cats]
+    start = REF_DATE - timedelta(days=DAYS - 1)
+    for _ in range(count):
+        cat = rng.choices(cats, weights)[0]
+        _w, mu, sigma, descriptions = PROFILE[cat]
+        day = start + timedelta(days=int((DAYS - 1) * rng.random() ** 0.8))
+        yield round(rng.lognormvariate(mu, sigma), 2), cat, day.isoformat(), rng.choice(descriptions)
+
+
+def _use_database(path: str) -> None:
+    """Point database/models at `path` and drop every per-user cache from the previous database."""
+    database.close_connections()
+    database.DB_NAME = path
+    models.clear_cycle_cache()
+    models._settings_cache.clear()
+    utils.release_snapshots()
+    database.init_db()
+
+
+def ensure_dataset(users: int, rows: int, seed: int, regenerate: bool = False) -> Tuple[str, float | None]:
+    """Return (db path, seconds spent generating or None if reused) for `users` x rows/users expenses."""
+    os.makedirs(BENCH_DIR, exist_ok=True)
+    path = os.path.join(BENCH_DIR, f"bench_{users}u_{rows}r_s{seed}.db")
+    if os.path.exists(path) and not regenerate:
+        _use_database(path)
+        return path, None
+    for suffix in ("", "-wal", "-shm", "-journal"):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+    t0 = time.perf_counter()
+    _use_database(path)
+    rng = random.Random(seed)
+    per_user = rows // users
+    for i in range(users):
+        uid = models.create_user(_user_email(i), PASSWORD)
+        models.update_user_settings(uid, rng.randint(1, 28), float(rng.choice([2000, 3500, 5000, 8000])))
+        # restul impartirii merge la primul utilizator, ca totalul sa fie exact `rows`
+        count = per_user + (rows - per_user * users if i == 0 else 0)
+        models.add_expenses_bulk(uid, generate_rows(seed, i, count))
+        print(f"  generated user {i + 1}/{users}", file=sys.stderr)
+    return path, time.perf_counter() - t0
+
+
+def _timed(fn: Callable, repeat: int, before: Callable | None = None) -> Dict:
+    """One cold run (first_ms, e.g. snapshot load / imports) + `repeat` runs for the statistics."""
+    runs = []
+    for _ in range(repeat + 1):
+        if before:
+            before()
+        t0 = time.perf_counter()
+        fn()
+        runs.append((time.perf_counter() - t0) * 1000)
+    first, runs = runs[0], runs[1:]
+    return {
+        "first_ms": round(first, 3),
+        "min_ms": round(min(runs), 3),
+        "median_ms": round(statistics.median(runs), 3),
+        "mean_ms": round(statistics.fmean(runs), 3),
+        "runs_ms": [round(r, 3) for r in runs],
+    }
+
+
+def run_operations(repeat: int) -> Dict[str, Dict]:
+    """Time the hot paths for the first (largest) benchmark user of the current database."""
+    uid, _is_admin = models.authenticate_user(_user_email(0), PASSWORD)
+    from_date, to_date = (REF_DATE - timedelta(days=180)).isoformat(), REF_DATE.isoformat()
+    tmp = tempfile.mkdtemp(prefix="bench_")
+    csv_path, txt_path = os.path.join(tmp, "export.csv"), os.path.join(tmp, "export.txt")
+
+    def apply_filters(search=None, sort_field="amount"):
+        # ce face ExpenseApp.load_expenses la Apply: numarul total + primul bloc al tabelului
+        models.count_expenses(uid, "Mâncare", from_date, to_date, search)
+        models.query_expenses(uid, "Mâncare", from_date, to_date, sort_field, "DESC", limit=200, search=search)
+
+    ops = {
+        "authenticate_user": (lambda: models.authenticate_user(_user_email(0), PASSWORD), None),
+        "get_all_expenses": (lambda: models.get_all_expenses(uid), None),
+        "get_cycle_remaining_cold": (lambda: models.get_cycle_remaining(uid, REF_DATE),
+                                     lambda: models.clear_cycle_cache(uid)),
+        "get_cycle_remaining_warm": (lambda: models.get_cycle_remaining(uid, REF_DATE), None),
+        "apply_filters": (apply_filters, None),
+        "apply_filters_search": (lambda: apply_filters("netflix", "relevance"), None),
+        "get_expense_summary": (lambda: models.get_expense_summary(uid, include_daily=True, ref=REF_DATE), None),
+        "export_csv": (lambda: utils.export_csv(uid, csv_path), None),
+        "export_txt_summary": (lambda: utils.export_txt_summary(uid, txt_path), None),
+    }
+    results = {}
+    try:
+        for name, (fn, before) in ops.items():
+            results[name] = _timed(fn, repeat, before)
+            print(f"  {name}: median {results[name]['median_ms']:.2f} ms", file=sys.stderr)
+    finally:
+        for p in (csv_path, txt_path):
+            if os.path.exists(p):
+                os.remove(p)
+        os.rmdir(tmp)
+    return results
+
+
+def _metadata(seed: int, repeat: int) -> Dict:
+    here = os.path.dirname(os.path.abspath(__file__))
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=here,
+                                capture_output=True, text=True).stdout.strip() or None
+    except OSError:
+        commit = None
+    return {
+        "timestamp": datetime.now().isoformat(timespec="seconds"),
+        "commit": commit,
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "platform": platform.platform(),
+        "seed": seed,
+        "repeat": repeat,
+        "ref_date": REF_DATE.isoformat(),
+    }
+
+
+def compare(new: Dict, old: Dict) -> None:
+    """Print median_ms new / old for every (dataset, operation) present in both runs."""
+    old_sets = {(d["users"], d["rows"]): d["results"] for d in old["datasets"]}
+    for d in new["datasets"]:
+        prev = old_sets.get((d["users"], d["rows"]))
+        if prev is None:
+            continue
+        print(f"{d['users']} users x {d['rows']} rows (old {old['meta'].get('commit')} -> new {new['meta'].get('commit')})")
+        for name, res in d["results"].items():
+            if name in prev:
+                before, after = prev[name]["median_ms"], res["median_ms"]
+                ratio = after / before if before else float("inf")
+                print(f"  {name:28s} {before:10.2f} ms -> {after:10.2f} ms  x{ratio:.2f}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Reproducible benchmark on synthetic expenses.")
+    parser.add_argument("--rows", default="10k,100k,1M", help="dimensiuni separate prin virgula (ex. 10k,100k,1M)")
+    parser.add_argument("--users", type=int, default=10)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--regenerate", action="store_true", help="reface bazele de date sintetice")
+    parser.add_argument("--out", help="scrie JSON-ul in fisier in loc de stdout")
+    parser.add_argument("--compare", help="JSON dintr-o rulare anterioara, pentru comparatie")
+    parser.add_argument("--instrument", action="store_true",
+                        help="activeaza instrumentation.py si adauga raportul lui la fiecare set de date")
+    args = parser.parse_args()
+    if args.instrument:
+        instrumentation.enable()
+
+    report = {"meta": _metadata(args.seed, args.repeat), "datasets": []}
+    try:
+        for rows in (parse_size(s) for s in args.rows.split(",")):
+            print(f"{args.users} users x {rows} rows", file=sys.stderr)
+            path, generate_s = ensure_dataset(args.users, rows, args.seed, args.regenerate)
+            instrumentation.reset()
+            dataset = {
+                "users": args.users,
+                "rows": rows,
+                "db": os.path.relpath(path),
+                "generate_s": None if generate_s is None else round(generate_s, 2),
+                "results": run_operations(args.repeat),
+            }
+            if args.instrument:
+                dataset["instrumentation"] = instrumentation.report()
+            report["datasets"].append(dataset)
+    finally:
+        database.close_connections()
+
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.out:
+        with open(args.out, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            compare(report, json.load(f))
+
+
+if __name__ == "__main__":
+    main()
@@ -1,44 +1,328 @@
+import atexit
+import functools
+import random
 import sqlite3
-from typing import Optional
+import threading
+import time
+from contextlib import contextmanager
+from typing import Callable, Iterator, List, Optional
 
 DB_NAME = "expenses.db"
 
+# expenses.day / expense_daily.day = date.toordinal(); day + JULIAN_DAY_OFFSET = julianday(data)
+# (SQL: date(day + JULIAN_DAY_OFFSET) -> 'YYYY-MM-DD', CAST(julianday(d) - JULIAN_DAY_OFFSET AS INTEGER) -> day)
+JULIAN_DAY_OFFSET = 1721424.5
 
-def get_connection() -> sqlite3.Connection:
-    """Return a SQLite connection to the project database."""
-    return sqlite3.connect(DB_NAME)
+# Setarile de stocare aplicate pe fiecare conexiune noua (vezi configure_storage).
+# WAL: cititorii nu blocheaza scriitorul si invers, si intre procese (doua instante ale aplicatiei);
+# synchronous=NORMAL e sigur in WAL (se pot pierde doar ultimele commit-uri la o cadere de curent).
+STORAGE = {
+    "busy_timeout": 5000,        # ms de asteptare dupa un lock inainte de SQLITE_BUSY
+    "journal_mode": "WAL",
+    "synchronous": "NORMAL",
+    "cache_size": -16000,        # negativ = KiB (16 MB page cache per conexiune)
+    "mmap_size": 64 * 1024 * 1024,
+}
 
+# O conexiune persistenta per thread (sqlite3 nu permite partajarea sigura intre thread-uri).
+_local = threading.local()
+_generation_lock = threading.Lock()
+_generation = 0  # crescut la close_connections(); fiecare thread isi inchide singur conexiunea veche
+_connection_factory: type = sqlite3.Connection  # ex. conexiuni cronometrate (instrumentation.py)
 
-def _column_exists(conn: sqlite3.Connection, table: str, column: str) -> bool:
-    cur = conn.cursor()
-    cur.execute(f"PRAGMA table_info({table})")
-    cols = [r[1] for r in cur.fetchall()]
-    return column in cols
 
+def _apply_storage(conn: sqlite3.Connection) -> None:
+    # busy_timeout primul: schimbarea journal_mode poate astepta dupa alt proces
+    for pragma in ("busy_timeout", "journal_mode", "synchronous", "cache_size", "mmap_size"):
+        value = STORAGE.get(pragma)
+        if value is not None:
+            conn.execute(f"PRAGMA {pragma} = {value}")
 
-def _table_exists(conn: sqlite3.Connection, table: str) -> bool:
-    cur = conn.cursor()
-    cur.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,))
-    return cur.fetchone() is not None
 
+def configure_storage(**settings) -> None:
+    """
+    Change STORAGE (e.g. configure_storage(mmap_size=0, synchronous="FULL")) and reopen the
+    connections so every thread picks the new settings up. Unknown keys raise ValueError.
+    """
+    unknown = set(settings) - set(STORAGE)
+    if unknown:
+        raise ValueError(f"Unknown storage settings: {', '.join(sorted(unknown))}")
+    STORAGE.update(settings)
+    close_connections()
 
-def init_db() -> None:
-    """Create tables if not present and ensure required columns exist."""
+
+def _connect() -> sqlite3.Connection:
+    # isolation_level=None -> controlam explicit BEGIN/COMMIT in transaction()
+    conn = sqlite3.connect(DB_NAME, isolation_level=None, check_same_thread=False,
+                           timeout=STORAGE["busy_timeout"] / 1000, factory=_connection_factory)
+    _apply_storage(conn)
+    return conn
+
+
+def set_connection_factory(factory: Optional[type] = None) -> None:
+    """
+    Open connections as `factory` (a sqlite3.Connection subclass; None -> sqlite3.Connection)
+    and reopen the ones already open so every thread picks it up.
+    """
+    global _connection_factory
+    _connection_factory = factory or sqlite3.Connection
+    close_connections()
+
+
+def get_connection() -> sqlite3.Connection:
+    """
+    Return the long-lived SQLite connection of the calling thread.
+    The connection is opened on first use and reused until close_connections(); after that
+    the thread closes its old connection here, on its next call.
+    """
+    conn = getattr(_local, "conn", None)
+    # in mijlocul unei tranzactii pastram conexiunea; o schimbam la urmatorul apel din afara ei
+    if conn is None or (_local.key != (DB_NAME, _generation) and not _local.depth):
+        if conn is not None:
+            _forget(conn)
+        conn = _connect()
+        _local.conn, _local.key, _local.depth = conn, (DB_NAME, _generation), 0
+    return conn
+
+
+@contextmanager
+def transaction(immediate: bool = False) -> Iterator[sqlite3.Connection]:
+    """
+    Run the block in a transaction on the thread's connection.
+    Commits on success, rolls back on error; nested blocks join the outer transaction.
+    immediate=True (BEGIN IMMEDIATE) takes the write lock up front, for blocks that write:
+    waiting for it honours busy_timeout, while upgrading a read transaction later can fail at once.
+    """
     conn = get_connection()
-    cur = conn.cursor()
+    if _local.depth:
+        _local.depth += 1
+        try:
+            yield conn
+        finally:
+            _local.depth -= 1
+        return
+
+    conn.execute("BEGIN IMMEDIATE" if immediate else "BEGIN")
+    _local.depth = 1
+    try:
+        yield conn
+    except BaseException:
+        conn.rollback()
+        raise
+    else:
+        try:
+            if immediate:
+                _commit_own(conn)
+            else:
+                conn.commit()
+        except BaseException:
+            # COMMIT esuat (BUSY, interrupt): fara rollback conexiunea ramane in tranzactie
+            # si orice BEGIN ulterior pe acest thread ar esua
+            if conn.in_transaction:
+                conn.rollback()
+            raise
+    finally:
+        _local.depth = 0
+
+
+# ---------- Scrieri facute de alte procese ----------
+# O conexiune dedicata citeste PRAGMA data_version, care se schimba la fiecare commit al ALTEI conexiuni.
+# Commit-urile proprii (transaction(immediate=True)) sunt absorbite sub _watch_lock, altfel fiecare
+# scriere dintr-un thread ar golea cache-urile procesului (models.check_external_changes).
+_watch_lock = threading.Lock()
+_watch = {"conn": None, "key": None, "seen": None, "pending": False}
+
+
+def _watch_version() -> int:
+    # apelat cu _watch_lock tinut
+    if _watch["key"] != (DB_NAME, _generation):
+        if _watch["conn"] is not None:
+            _forget(_watch["conn"])
+        conn = sqlite3.connect(DB_NAME, isolation_level=None, check_same_thread=False)
+        # alta baza / conexiuni redeschise: nu stim ce s-a schimbat intre timp
+        _watch.update(conn=conn, key=(DB_NAME, _generation), seen=None, pending=True)
+    return _watch["conn"].execute("PRAGMA data_version").fetchone()[0]
+
+
+def _commit_own(conn: sqlite3.Connection) -> None:
+    with _watch_lock:
+        if _watch_version() != _watch["seen"]:
+            _watch["pending"] = True  # alt proces a scris inainte de tranzactia noastra
+        mark = conn.execute("PRAGMA data_version").fetchone()[0]
+        conn.commit()
+        _watch["seen"] = _watch_version()
+        # data_version-ul conexiunii noastre nu se schimba la propriul commit, doar la al altcuiva
+        if conn.execute("PRAGMA data_version").fetchone()[0] != mark:
+            _watch["pending"] = True
+
+
+def data_changed() -> bool:
+    """
+    True if another connection (usually another process) committed since the previous call.
+    Commits made in this process through transaction(immediate=True) are not reported.
+    """
+    with _watch_lock:
+        version = _watch_version()
+        changed = _watch["pending"] or version != _watch["seen"]
+        _watch["seen"], _watch["pending"] = version, False
+        return changed
+
+
+def is_busy_error(e: sqlite3.OperationalError) -> bool:
+    """True for SQLITE_BUSY / SQLITE_LOCKED (incl. extended codes such as BUSY_SNAPSHOT)."""
+    code = getattr(e, "sqlite_errorcode", None)  # Python 3.11+
+    if code is not None:
+        return code & 0xFF in (sqlite3.SQLITE_BUSY, sqlite3.SQLITE_LOCKED)
+    msg = str(e).lower()
+    return "locked" in msg or "busy" in msg
+
+
+def retry_on_busy(attempts: int = 5, base_delay: float = 0.05, max_delay: float = 1.0) -> Callable:
+    """
+    Retry the decorated call when SQLite reports BUSY/LOCKED (another process holds the lock
+    longer than busy_timeout), with exponential backoff + jitter. Only the outermost call retries:
+    inside an open transaction the error is re-raised, since the whole transaction must be redone.
+    """
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            for attempt in range(attempts):
+                try:
+                    return fn(*args, **kwargs)
+                except sqlite3.OperationalError as e:
+                    if not is_busy_error(e) or attempt == attempts - 1 or getattr(_local, "depth", 0):
+                        raise
+                    delay = min(max_delay, base_delay * 2 ** attempt)
+                    time.sleep(delay * (0.5 + random.random()))
+        return wrapper
+    return decorator
+
+
+def _forget(conn: sqlite3.Connection) -> None:
+    try:
+        conn.close()
+    except sqlite3.Error:
+        pass
+
+
+def close_connections() -> None:
+    """
+    Retire every thread's connection: the caller's is closed now, the others are closed by
+    their own threads on the next get_connection(). Safe to call multiple times.
+    """
+    global _generation
+    # o conexiune se inchide doar din thread-ul ei: inchisa din alt thread in timpul unei
+    # interogari, sqlite3 poate cadea (SIGSEGV) sau lasa un export pe jumatate
+    with _generation_lock:
+        _generation += 1
+    conn = getattr(_local, "conn", None)
+    if conn is not None and not getattr(_local, "depth", 0):
+        _local.conn = None
+        _forget(conn)
+    with _watch_lock:  # folosita doar sub lock
+        if _watch["conn"] is not None:
+            _forget(_watch["conn"])
+            _watch.update(conn=None, key=None)
+
+
+atexit.register(close_connections)
+
+
+def explain_query_plan(sql: str, params: tuple = ()) -> List[str]:
+    """Return the `detail` lines of EXPLAIN QUERY PLAN for a statement."""
+    rows = get_connection().execute(f"EXPLAIN QUERY PLAN {sql}", params).fetchall()
+    return [r[3] for r in rows]
+
+
+def _create_triggers(conn: sqlite3.Connection, script: str) -> None:
+    for stmt in script.split("END;"):
+        if stmt.strip():
+            conn.execute(stmt + "END;")
+
+
+# Rollup zilnic per (user, zi, categorie), tinut la zi de triggere pe expenses.
+_ROLLUP_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_daily_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expense_daily (user_id, day, category, total_cents, n)
+        VALUES (NEW.user_id, NEW.day, NEW.category, NEW.amount_cents, 1)
+        ON CONFLICT(user_id, day, category) DO UPDATE SET total_cents = total_cents + excluded.total_cents, n = n + 1;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_daily_delete AFTER DELETE ON expenses BEGIN
+        UPDATE expense_daily SET total_cents = total_cents - OLD.amount_cents, n = n - 1
+        WHERE user_id = OLD.user_id AND day = OLD.day AND category = OLD.category;
+        DELETE FROM expense_daily
+        WHERE user_id = OLD.user_id AND day = OLD.day AND category = OLD.category AND n <= 0;
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_daily_update
+    AFTER UPDATE OF user_id, amount_cents, category, day ON expenses BEGIN
+        UPDATE expense_daily SET total_cents = total_cents - OLD.amount_cents, n = n - 1
+        WHERE user_id = OLD.user_id AND day = OLD.day AND category = OLD.category;
+        DELETE FROM expense_daily
+        WHERE user_id = OLD.user_id AND day = OLD.day AND category = OLD.category AND n <= 0;
+        INSERT INTO expense_daily (user_id, day, category, total_cents, n)
+        VALUES (NEW.user_id, NEW.day, NEW.category, NEW.amount_cents, 1)
+        ON CONFLICT(user_id, day, category) DO UPDATE SET total_cents = total_cents + excluded.total_cents, n = n + 1;
+    END;
+"""
+
+
+def rebuild_rollups() -> None:
+    """Recompute expense_daily from the raw expenses (for existing databases or after manual edits)."""
+    with transaction(immediate=True) as conn:
+        conn.execute("DELETE FROM expense_daily")
+        conn.execute(
+            "INSERT INTO expense_daily (user_id, day, category, total_cents, n) "
+            "SELECT user_id, day, category, SUM(amount_cents), COUNT(*) FROM expenses GROUP BY user_id, day, category"
+        )
+
+
+# Index full-text pe description (FTS5, external content = expenses), sincronizat de triggere.
+_SEARCH_TRIGGERS = """
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_insert AFTER INSERT ON expenses BEGIN
+        INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, COALESCE(NEW.description, ''));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_delete AFTER DELETE ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description)
+        VALUES ('delete', OLD.id, COALESCE(OLD.description, ''));
+    END;
+
+    CREATE TRIGGER IF NOT EXISTS trg_expenses_fts_update AFTER UPDATE OF description ON expenses BEGIN
+        INSERT INTO expenses_fts (expenses_fts, rowid, description)
+        VALUES ('delete', OLD.id, COALESCE(OLD.description, ''));
+        INSERT INTO expenses_fts (rowid, description) VALUES (NEW.id, COALESCE(NEW.description, ''));
+    END;
+"""
+
+
+def rebuild_search_index() -> None:
+    """Re-read every description into expenses_fts (after manual edits of the expenses table)."""
+    with transaction(immediate=True) as conn:
+        conn.execute("INSERT INTO expenses_fts (expenses_fts) VALUES ('rebuild')")
 
+
+# ---------- Migrations (PRAGMA user_version = nr. de migrari aplicate) ----------
+def _migration_base_schema(conn: sqlite3.Connection) -> None:
+    """users, expenses, user_settings. Idempotent: bazele de date vechi (user_version 0) au deja tabelele."""
     # users
-    cur.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS users (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             email TEXT UNIQUE NOT NULL,
             password TEXT NOT NULL,
-            created_at TEXT
+            created_at TEXT,
+            is_admin INTEGER NOT NULL DEFAULT 0
         )
     """)
+    # bazele de date dinainte de is_admin
+    cols = [r[1] for r in conn.execute("PRAGMA table_info(users)")]
+    if "is_admin" not in cols:
+        conn.execute("ALTER TABLE users ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0")
 
     # expenses
-    cur.execute("""
+    conn.execute("""
         CREATE TABLE IF NOT EXISTS expenses (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             user_id INTEGER NOT NULL,
@@ -50,25 +334,201 @@ def init_db() -> None:
         )
     """)
 
-    # migrations: ensure is_admin on users
-    if not _column_exists(conn, "users", "is_admin"):
-        cur.execute("ALTER TABLE users ADD COLUMN is_admin INTEGER NOT NULL DEFAULT 0")
-
     # user_settings (per-user payday + monthly budget)
-    if not _table_exists(conn, "user_settings"):
-        cur.execute("""
-            CREATE TABLE user_settings (
-                user_id INTEGER PRIMARY KEY,
-                payday INTEGER NOT NULL DEFAULT 1,
-                monthly_budget REAL NOT NULL DEFAULT 0,
-                FOREIGN KEY (user_id) REFERENCES users(id)
-            )
-        """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS user_settings (
+            user_id INTEGER PRIMARY KEY,
+            payday INTEGER NOT NULL DEFAULT 1,
+            monthly_budget REAL NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+
+
+def _migration_expense_indexes(conn: sqlite3.Connection) -> None:
+    # indexes for the per-user hot paths (listari ordonate dupa data, sume pe interval/categorie)
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_date ON expenses(user_id, date, id, amount)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_cat_date ON expenses(user_id, category, date, amount)")
+
+
+def _migration_daily_rollup(conn: sqlite3.Connection) -> None:
+    # expense_daily: sume si numar de cheltuieli pe (user, zi, categorie) pentru grafice/bugete/rapoarte.
+    # Forma de aici (date TEXT, total REAL) e inlocuita de _migration_compact_storage.
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS expense_daily (
+            user_id INTEGER NOT NULL,
+            date TEXT NOT NULL,
+            category TEXT NOT NULL,
+            total REAL NOT NULL DEFAULT 0,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, date, category)
+        ) WITHOUT ROWID
+    """)
+    _create_triggers(conn, """
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_daily_insert AFTER INSERT ON expenses BEGIN
+            INSERT INTO expense_daily (user_id, date, category, total, n)
+            VALUES (NEW.user_id, NEW.date, NEW.category, NEW.amount, 1)
+            ON CONFLICT(user_id, date, category) DO UPDATE SET total = total + excluded.total, n = n + 1;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_daily_delete AFTER DELETE ON expenses BEGIN
+            UPDATE expense_daily SET total = total - OLD.amount, n = n - 1
+            WHERE user_id = OLD.user_id AND date = OLD.date AND category = OLD.category;
+            DELETE FROM expense_daily
+            WHERE user_id = OLD.user_id AND date = OLD.date AND category = OLD.category AND n <= 0;
+        END;
+
+        CREATE TRIGGER IF NOT EXISTS trg_expenses_daily_update
+        AFTER UPDATE OF user_id, amount, category, date ON expenses BEGIN
+            UPDATE expense_daily SET total = total - OLD.amount, n = n - 1
+            WHERE user_id = OLD.user_id AND date = OLD.date AND category = OLD.category;
+            DELETE FROM expense_daily
+            WHERE user_id = OLD.user_id AND date = OLD.date AND category = OLD.category AND n <= 0;
+            INSERT INTO expense_daily (user_id, date, category, total, n)
+            VALUES (NEW.user_id, NEW.date, NEW.category, NEW.amount, 1)
+            ON CONFLICT(user_id, date, category) DO UPDATE SET total = total + excluded.total, n = n + 1;
+        END;
+    """)
+    # o baza fara user_version poate avea deja tabela (creata inainte de migrari): o reconstruim
+    conn.execute("DELETE FROM expense_daily")
+    conn.execute(
+        "INSERT INTO expense_daily (user_id, date, category, total, n) "
+        "SELECT user_id, date, category, SUM(amount), COUNT(*) FROM expenses GROUP BY user_id, date, category"
+    )
+
+
+def _migration_canonical_emails(conn: sqlite3.Connection) -> None:
+    # emailuri canonice (trim + lower), ca login-ul sa poata cauta `email=?` pe indexul UNIQUE.
+    # OR IGNORE: daca forma canonica exista deja la alt cont, randul vechi ramane neschimbat.
+    conn.execute("UPDATE OR IGNORE users SET email = lower(trim(email)) WHERE email != lower(trim(email))")
+
+
+def _migration_description_search(conn: sqlite3.Connection) -> None:
+    # cautare full-text in descrieri; remove_diacritics: "mancare" gaseste si "mâncare"
+    conn.execute("""
+        CREATE VIRTUAL TABLE IF NOT EXISTS expenses_fts USING fts5(
+            description,
+            content='expenses',
+            content_rowid='id',
+            tokenize='unicode61 remove_diacritics 2'
+        )
+    """)
+    _create_triggers(conn, _SEARCH_TRIGGERS)
+    rebuild_search_index()
+
 
-    conn.commit()
-    conn.close()
+def _migration_compact_storage(conn: sqlite3.Connection) -> None:
+    """
+    expenses.amount REAL -> amount_cents INTEGER (bani) si date TEXT -> day INTEGER (date.toordinal()):
+    sume exacte, randuri si intrari de index mai mici, comparatii pe intregi in loc de text.
+    SQLite nu poate schimba tipul unei coloane, deci tabelul e reconstruit (id-urile se pastreaza,
+    deci si indexul FTS); expense_daily trece la (day, total_cents) la fel.
+    Randurile care nu se pot converti (text in amount, date care nu sunt YYYY-MM-DD) sunt mutate
+    neschimbate in expenses_invalid, ca sa nu se piarda.
+    """
+    valid = "typeof(amount) IN ('integer', 'real') AND date(date) IS date"
+    columns = "id, user_id, amount, category, date, description"
+    conn.execute(f"CREATE TABLE IF NOT EXISTS expenses_invalid AS SELECT {columns} FROM expenses WHERE 0")
+    conn.execute(f"INSERT INTO expenses_invalid ({columns}) SELECT {columns} FROM expenses WHERE NOT ({valid})")
+    seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'expenses'").fetchone()
+
+    conn.execute("""
+        CREATE TABLE expenses_new (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            user_id INTEGER NOT NULL,
+            amount_cents INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            day INTEGER NOT NULL,
+            description TEXT,
+            FOREIGN KEY (user_id) REFERENCES users(id)
+        )
+    """)
+    conn.execute(
+        "INSERT INTO expenses_new (id, user_id, amount_cents, category, day, description) "
+        f"SELECT id, user_id, CAST(round(amount * 100) AS INTEGER), category, "
+        f"CAST(julianday(date) - {JULIAN_DAY_OFFSET} AS INTEGER), description FROM expenses WHERE {valid}"
+    )
+    # DROP ia cu el indexurile si triggerele vechi
+    conn.execute("DROP TABLE expenses")
+    conn.execute("ALTER TABLE expenses_new RENAME TO expenses")
+    if seq:
+        # AUTOINCREMENT: id-urile sterse (sau mutate in expenses_invalid) nu se refolosesc
+        cur = conn.execute("UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'expenses'", seq)
+        if not cur.rowcount:
+            conn.execute("INSERT INTO sqlite_sequence (name, seq) VALUES ('expenses', ?)", seq)
+    conn.execute("CREATE INDEX idx_expenses_user_date ON expenses(user_id, day, id, amount_cents)")
+    conn.execute("CREATE INDEX idx_expenses_user_cat_date ON expenses(user_id, category, day, amount_cents)")
+
+    conn.execute("DROP TABLE expense_daily")
+    conn.execute("""
+        CREATE TABLE expense_daily (
+            user_id INTEGER NOT NULL,
+            day INTEGER NOT NULL,
+            category TEXT NOT NULL,
+            total_cents INTEGER NOT NULL DEFAULT 0,
+            n INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day, category)
+        ) WITHOUT ROWID
+    """)
+    _create_triggers(conn, _ROLLUP_TRIGGERS)
+    rebuild_rollups()
+    _create_triggers(conn, _SEARCH_TRIGGERS)
+    # scoate din index descrierile randurilor mutate in expenses_invalid
+    rebuild_search_index()
+
+
+def _migration_sort_indexes(conn: sqlite3.Connection) -> None:
+    # paginile din query_expenses sortate dupa suma / categorie (ORDER BY col, id) citesc indexul in ordine,
+    # fara sa sorteze toate cheltuielile utilizatorului intr-un B-tree temporar
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_amount ON expenses(user_id, amount_cents, id)")
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_expenses_user_cat_id ON expenses(user_id, category, id)")
+
+
+# Ordinea conteaza si lista doar creste: migrarea i (de la 1) ridica user_version la i.
+MIGRATIONS = [
+    _migration_base_schema,
+    _migration_expense_indexes,
+    _migration_daily_rollup,
+    _migration_canonical_emails,
+    _migration_description_search,
+    _migration_compact_storage,
+    _migration_sort_indexes,
+]
+SCHEMA_VERSION = len(MIGRATIONS)
+
+
+def schema_version() -> int:
+    return get_connection().execute("PRAGMA user_version").fetchone()[0]
+
+
+def init_db() -> None:
+    """
+    Bring the schema up to SCHEMA_VERSION by applying the pending migrations once.
+    On an up-to-date database this is a single PRAGMA user_version read.
+    """
+    if schema_version() >= SCHEMA_VERSION:
+        return
+    with transaction(immediate=True) as conn:
+        # recitim in tranzactie: alt proces poate fi migrat intre timp
+        version = schema_version()
+        for number, migration in enumerate(MIGRATIONS[version:], start=version + 1):
+            migration(conn)
+            conn.execute(f"PRAGMA user_version = {number}")
 
 
 if __name__ == "__main__":
+    import sys
+
     init_db()
     print("DB initialized ✅")
+    if "--rebuild-rollups" in sys.argv:
+        rebuild_rollups()
+        print("Rollups rebuilt ✅")
+    if "--rebuild-search" in sys.argv:
+        rebuild_search_index()
+        print("Search index rebuilt ✅")
+    if "--check-plans" in sys.argv:
+        import models
+
+        for name, plan in models.check_query_plans().items():
+            print(f"{name}: {' | '.join(plan)}")
@@ -0,0 +1,325 @@
+"""
+Masuratori de latenta per operatie + jurnal de interogari lente.
+
+    import instrumentation
+    instrumentation.enable(slow_ms=50)      # o data, la pornire (app.py o face deja)
+    ...
+    instrumentation.report()                # dict: operatii (count, p50/p95/p99) + interogari lente
+    instrumentation.dump_json("stats.json")
+
+Operatiile sunt de doua feluri:
+  models.<functie>  - fiecare functie publica din models.py, cronometrata la apel
+  sql: <statement>  - fiecare instructiune SQL, cronometrata de cursorul conexiunii: se aduna doar
+                      timpul petrecut in execute/fetch, nu pauzele dintre ele, pana la epuizarea
+                      cursorului (valorile literale sunt inlocuite cu ? ca instructiunile sa se grupeze)
+"""
+from __future__ import annotations
+
+import functools
+import inspect
+import json
+import re
+import sqlite3
+import threading
+import time
+from collections import deque
+from datetime import datetime
+from typing import Callable, Dict, List
+
+import database
+import models
+
+SLOW_QUERY_MS = 50.0
+SAMPLE_SIZE = 1024  # percentilele se calculeaza pe ultimele SAMPLE_SIZE apeluri ale fiecarei operatii
+SLOW_LOG_SIZE = 200
+
+_lock = threading.Lock()
+_ops: Dict[str, "_OpStats"] = {}
+_slow: "deque[dict]" = deque(maxlen=SLOW_LOG_SIZE)
+_originals: Dict[str, Callable] = {}
+_slow_ms = SLOW_QUERY_MS
+_enabled = False
+
+_LITERALS = re.compile(r"'(?:[^']|'')*'|\b\d+(?:\.\d+)?(?:[eE][+-]?\d+)?\b")
+_EXPLAINABLE = ("SELECT", "INSERT", "UPDATE", "DELETE", "WITH", "REPLACE")
+
+
+class _OpStats:
+    __slots__ = ("count", "total", "max", "samples")
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.samples: "deque[float]" = deque(maxlen=SAMPLE_SIZE)
+
+    def add(self, ms: float) -> None:
+        self.count += 1
+        self.total += ms
+        self.max = max(self.max, ms)
+        self.samples.append(ms)
+
+    def summary(self) -> dict:
+        ordered = sorted(self.samples)
+
+        def pct(p: float) -> float:
+            # nearest-rank
+            return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3) if ordered else 0.0
+
+        return {
+            "count": self.count,
+            "total_ms": round(self.total, 3),
+            "mean_ms": round(self.total / self.count, 3) if self.count else 0.0,
+            "p50_ms": pct(0.50),
+            "p95_ms": pct(0.95),
+            "p99_ms": pct(0.99),
+            "max_ms": round(self.max, 3),
+        }
+
+
+def record(name: str, ms: float) -> None:
+    """Add one latency sample (milliseconds) to operation `name`."""
+    with _lock:
+        stats = _ops.get(name)
+        if stats is None:
+            stats = _ops[name] = _OpStats()
+        stats.add(ms)
+
+
+def normalize_sql(sql: str) -> str:
+    """Replace literal values with ? and collapse whitespace, so one statement shape = one operation."""
+    return " ".join(_LITERALS.sub("?", sql).split())
+
+
+# ---------- SQL timing ----------
+_statement_key = functools.lru_cache(maxsize=1024)(normalize_sql)
+
+
+def _statement_done(sql: str, params, ms: float) -> None:
+    key = _statement_key(sql)
+    record(f"sql: {key}", ms)
+    if ms >= _slow_ms:
+        with _lock:
+            _slow.append({
+                "at": datetime.now().isoformat(timespec="seconds"),
+                "ms": round(ms, 3),
+                "sql": key,
+                "plan": None,  # EXPLAIN QUERY PLAN ruleaza la report(), nu pe calea interogarii
+                "_sql": sql,
+                "_params": params,
+            })
+
+
+class _TimedCursor(sqlite3.Cursor):
+    """
+    Cursor that adds up the time spent inside execute/executemany/fetch* for its statement and
+    records it once the statement is done: no result rows, rows exhausted, next execute, close().
+    """
+
+    _pending = None  # [sql, params, ms] pentru instructiunea curenta
+
+    def _done(self) -> None:
+        pending, self._pending = self._pending, None
+        if pending is not None:
+            _statement_done(*pending)
+
+    def _add(self, started: float, exhausted: bool) -> None:
+        if self._pending is not None:
+            self._pending[2] += (time.perf_counter() - started) * 1000
+            if exhausted:
+                self._done()
+
+    def execute(self, sql, parameters=()):
+        self._done()
+        started = time.perf_counter()
+        try:
+            super().execute(sql, parameters)
+        finally:
+            self._pending = [sql, parameters, (time.perf_counter() - started) * 1000]
+            if self.description is None:  # fara randuri de citit (INSERT, UPDATE, BEGIN ...)
+                self._done()
+        return self
+
+    def executemany(self, sql, seq_of_parameters):
+        self._done()
+        started = time.perf_counter()
+        try:
+            super().executemany(sql, seq_of_parameters)
+        finally:
+            self._pending = [sql, None, (time.perf_counter() - started) * 1000]
+            self._done()
+        return self
+
+    def fetchone(self):
+        started = time.perf_counter()
+        row = super().fetchone()
+        self._add(started, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        started = time.perf_counter()
+        size = self.arraysize if size is None else size
+        rows = super().fetchmany(size)
+        self._add(started, len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        started = time.perf_counter()
+        rows = super().fetchall()
+        self._add(started, True)
+        return rows
+
+    def __next__(self):
+        started = time.perf_counter()
+        exhausted = False
+        try:
+            return super().__next__()
+        except StopIteration:
+            exhausted = True
+            raise
+        finally:
+            self._add(started, exhausted)
+
+    def close(self):
+        self._done()
+        super().close()
+
+    def __del__(self):
+        # conn.execute(...).fetchone(): cursorul dispare inainte sa fie epuizat
+        self._done()
+
+
+class _TimedConnection(sqlite3.Connection):
+    """Connection whose statements go through _TimedCursor; COMMIT / ROLLBACK are timed too."""
+
+    def cursor(self, factory=_TimedCursor):
+        return super().cursor(factory)
+
+    # Connection.execute* nu trec prin cursor() in implementarea C
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def commit(self):
+        started = time.perf_counter()
+        try:
+            super().commit()
+        finally:
+            _statement_done("COMMIT", (), (time.perf_counter() - started) * 1000)
+
+    def rollback(self):
+        started = time.perf_counter()
+        try:
+            super().rollback()
+        finally:
+            _statement_done("ROLLBACK", (), (time.perf_counter() - started) * 1000)
+
+
+# ---------- models wrappers ----------
+def _wrap(name: str, fn: Callable) -> Callable:
+    op = f"models.{name}"
+
+    if inspect.isgeneratorfunction(fn):
+        # generatoare (iter_expense_chunks): se aduna timpul din toata iteratia, fara cel al
+        # consumatorului intre doua bucati (ex. scrierea CSV-ului)
+        @functools.wraps(fn)
+        def gen_wrapper(*args, **kwargs):
+            it, ms = fn(*args, **kwargs), 0.0
+            try:
+                while True:
+                    started = time.perf_counter()
+                    try:
+                        item = next(it)
+                    except StopIteration:
+                        return
+                    finally:
+                        ms += (time.perf_counter() - started) * 1000
+                    yield item
+            finally:
+                it.close()
+                record(op, ms)
+        return gen_wrapper
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            record(op, (time.perf_counter() - started) * 1000)
+    return wrapper
+
+
+def enable(slow_ms: float = SLOW_QUERY_MS) -> None:
+    """Wrap every public function of models.py and time every SQL statement. Idempotent."""
+    global _enabled, _slow_ms
+    _slow_ms = slow_ms
+    if _enabled:
+        return
+    for name, fn in list(vars(models).items()):
+        if name.startswith("_") or not inspect.isfunction(fn) or fn.__module__ != models.__name__:
+            continue
+        _originals[name] = fn
+        setattr(models, name, _wrap(name, fn))
+    database.set_connection_factory(_TimedConnection)
+    _enabled = True
+
+
+def disable() -> None:
+    """Restore the original models functions and reopen the connections untimed."""
+    global _enabled
+    if not _enabled:
+        return
+    for name, fn in _originals.items():
+        setattr(models, name, fn)
+    _originals.clear()
+    database.set_connection_factory(None)
+    _enabled = False
+
+
+def is_enabled() -> bool:
+    return _enabled
+
+
+def reset() -> None:
+    with _lock:
+        _ops.clear()
+        _slow.clear()
+
+
+def _explain(entry: dict) -> List[str]:
+    sql, params = entry["_sql"], entry["_params"]
+    if params is None or not sql.lstrip().upper().startswith(_EXPLAINABLE):
+        return []  # executemany: parametrii nu se pastreaza
+    try:
+        return database.explain_query_plan(sql, params)
+    except sqlite3.Error as e:
+        return [f"(no plan: {e})"]
+
+
+def report() -> dict:
+    """
+    {"enabled", "slow_ms", "operations": {name: {count, total_ms, mean_ms, p50_ms, p95_ms, p99_ms, max_ms}},
+     "slow_queries": [{at, ms, sql, plan}]}; operations sorted by total time, slow queries newest first.
+    """
+    with _lock:
+        ops = {name: stats.summary() for name, stats in _ops.items()}
+        slow = list(_slow)
+    for entry in slow:
+        if entry["plan"] is None:
+            entry["plan"] = _explain(entry)
+    return {
+        "enabled": _enabled,
+        "slow_ms": _slow_ms,
+        "operations": dict(sorted(ops.items(), key=lambda kv: kv[1]["total_ms"], reverse=True)),
+        # textul cu valorile reale (emailuri, hash-uri de parola) nu iese din proces
+        "slow_queries": [{k: v for k, v in e.items() if not k.startswith("_")} for e in reversed(slow)],
+    }
+
+
+def dump_json(path: str) -> None:
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(report(), f, indent=2, ensure_ascii=False)
+        f.write("\n")
@@ -0,0 +1,231 @@
+"""
+Generator de incarcare pentru server.py: N clienti cu conexiuni keep-alive, amestec de cereri, raport req/s.
+
+    python loadgen.py --spawn                       # porneste server.py pe o baza temporara si il testeaza
+    python loadgen.py --url http://127.0.0.1:8765 --clients 16 --duration 20 --json
+"""
+from __future__ import annotations
+
+import argparse
+import http.client
+import json
+import os
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+from urllib.parse import quote, urlsplit
+
+CATEGORIES = ["Mâncare", "Transport", "Utilități", "Chirie", "Divertisment", "Altele"]
+# endpoint -> pondere in amestecul de cereri
+MIX = {
+    "list": 40,
+    "cycle": 20,
+    "add": 15,
+    "summary": 10,
+    "count": 10,
+    "export_csv": 5,
+}
+
+
+class Client:
+    """One keep-alive connection logged in as one API user."""
+
+    def __init__(self, host: str, port: int, email: str, password: str, rng: random.Random):
+        self.conn = http.client.HTTPConnection(host, port, timeout=30)
+        self.rng = rng
+        self.token = ""
+        status, _ = self.call("POST", "/api/register", {"email": email, "password": password})
+        if status not in (200, 409):
+            raise RuntimeError(f"register failed with HTTP {status}")
+        status, body = self.call("POST", "/api/login", {"email": email, "password": password})
+        if status != 200:
+            raise RuntimeError(f"login failed with HTTP {status}")
+        self.token = json.loads(body)["token"]
+
+    def call(self, method: str, path: str, payload: Optional[dict] = None) -> Tuple[int, bytes]:
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        body = None
+        if payload is not None:
+            body = json.dumps(payload).encode()
+            headers["Content-Type"] = "application/json"
+        self.conn.request(method, path, body=body, headers=headers)
+        resp = self.conn.getresponse()
+        return resp.status, resp.read()
+
+    def random_expense(self) -> dict:
+        day = date.today() - timedelta(days=self.rng.randrange(365))
+        return {"amount": round(self.rng.uniform(1, 300), 2), "category": self.rng.choice(CATEGORIES),
+                "date": day.isoformat(), "description": self.rng.choice(["netflix", "Lidl", "bilet tren", "cafea"])}
+
+    def request(self, kind: str) -> int:
+        if kind == "list":
+            return self.call("GET", f"/api/expenses?limit=50&sort={self.rng.choice(['date', 'amount'])}")[0]
+        if kind == "cycle":
+            return self.call("GET", "/api/cycle")[0]
+        if kind == "add":
+            return self.call("POST", "/api/expenses", self.random_expense())[0]
+        if kind == "summary":
+            return self.call("GET", "/api/summary")[0]
+        if kind == "count":
+            return self.call("GET", f"/api/expenses/count?category={quote(self.rng.choice(CATEGORIES))}")[0]
+        if kind == "export_csv":
+            return self.call("GET", "/api/export.csv")[0]
+        raise ValueError(kind)
+
+
+def _percentiles(samples: List[float]) -> Dict[str, float]:
+    ordered = sorted(samples)
+
+    def pct(p: float) -> float:
+        return round(ordered[min(len(ordered) - 1, int(p * len(ordered)))], 3)
+
+    return {"count": len(ordered), "p50_ms": pct(0.50), "p95_ms": pct(0.95), "p99_ms": pct(0.99),
+            "mean_ms": round(statistics.fmean(ordered), 3)}
+
+
+def run(url: str, clients: int, duration: float, users: int, seed_rows: int, seed: int) -> dict:
+    parts = urlsplit(url)
+    host, port = parts.hostname or "127.0.0.1", parts.port or 80
+    kinds, weights = list(MIX), list(MIX.values())
+    latencies: Dict[str, List[float]] = {k: [] for k in kinds}
+    errors: Dict[str, int] = {}
+    lock = threading.Lock()
+    window = [0.0, 0.0]  # (start, stop); fixat de ultimul fir care ajunge la bariera, inainte sa plece vreunul
+
+    def start_window() -> None:
+        window[0] = time.perf_counter()
+        window[1] = window[0] + duration
+
+    ready = threading.Barrier(clients + 1, action=start_window)
+
+    def worker(i: int) -> None:
+        rng = random.Random(f"{seed}:{i}")
+        try:
+            client = Client(host, port, f"loadgen{i % users}@example.com", "loadgen", rng)
+            # datele initiale: le adauga doar primul client al fiecarui utilizator
+            if i < users:
+                for _ in range(seed_rows):
+                    client.call("POST", "/api/expenses", client.random_expense())
+        except Exception as e:
+            with lock:
+                errors[f"setup: {e}"] = errors.get(f"setup: {e}", 0) + 1
+            ready.wait()
+            return
+        ready.wait()
+        local: Dict[str, List[float]] = {k: [] for k in kinds}
+        local_errors: Dict[str, int] = {}
+        while time.perf_counter() < window[1]:
+            kind = rng.choices(kinds, weights)[0]
+            t0 = time.perf_counter()
+            try:
+                status = client.request(kind)
+                ok = status == 200
+            except (OSError, http.client.HTTPException) as e:
+                ok, status = False, type(e).__name__
+                client.conn.close()  # se reconecteaza la urmatoarea cerere
+            if ok:
+                local[kind].append((time.perf_counter() - t0) * 1000)
+            else:
+                key = f"{kind}: {status}"
+                local_errors[key] = local_errors.get(key, 0) + 1
+        client.conn.close()
+        with lock:
+            for k, v in local.items():
+                latencies[k].extend(v)
+            for k, n in local_errors.items():
+                errors[k] = errors.get(k, 0) + n
+
+    threads = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(clients)]
+    for t in threads:
+        t.start()
+    ready.wait()
+    for t in threads:
+        t.join()
+    elapsed = time.perf_counter() - window[0]
+
+    total = sum(len(v) for v in latencies.values())
+    return {
+        "url": url,
+        "clients": clients,
+        "users": users,
+        "duration_s": round(elapsed, 3),
+        "requests": total,
+        "errors": sum(errors.values()),
+        "requests_per_s": round(total / elapsed, 1) if elapsed else 0.0,
+        "endpoints": {k: _percentiles(v) for k, v in latencies.items() if v},
+        "error_details": errors,
+    }
+
+
+def _spawn_server(port: int, workers: int) -> Tuple[subprocess.Popen, str]:
+    tmp = tempfile.mkdtemp(prefix="loadgen_")
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.Popen(
+        [sys.executable, os.path.join(here, "server.py"), "--port", str(port), "--workers", str(workers),
+         "--db", os.path.join(tmp, "loadgen.db")],
+        cwd=here, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 15
+    while time.time() < deadline:
+        try:
+            socket.create_connection(("127.0.0.1", port), timeout=0.5).close()
+            return proc, tmp
+        except OSError:
+            if proc.poll() is not None:
+                shutil.rmtree(tmp, ignore_errors=True)
+                raise RuntimeError("server.py exited during startup")
+            time.sleep(0.1)
+    proc.terminate()
+    proc.wait()
+    shutil.rmtree(tmp, ignore_errors=True)
+    raise RuntimeError("server.py did not start listening in time")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Load generator for server.py.")
+    parser.add_argument("--url", default="http://127.0.0.1:8765")
+    parser.add_argument("--clients", type=int, default=8, help="conexiuni keep-alive simultane")
+    parser.add_argument("--users", type=int, default=4, help="utilizatori API distincti (clientii ii impart)")
+    parser.add_argument("--duration", type=float, default=10.0, help="secunde")
+    parser.add_argument("--seed-rows", type=int, default=500, help="cheltuieli adaugate per utilizator inainte de test")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--spawn", action="store_true", help="porneste server.py pe o baza de date temporara")
+    parser.add_argument("--json", action="store_true", help="scrie rezultatul ca JSON")
+    args = parser.parse_args()
+
+    proc = None
+    url = args.url
+    if args.spawn:
+        port = urlsplit(url).port or 8765
+        proc, tmp = _spawn_server(port, args.clients + 2)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        result = run(url, args.clients, args.duration, max(1, min(args.users, args.clients)), args.seed_rows, args.seed)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait()
+            shutil.rmtree(tmp, ignore_errors=True)
+
+    if args.json:
+        print(json.dumps(result, indent=2, ensure_ascii=False))
+        return
+    print(f"{result['requests']} requests in {result['duration_s']:.1f} s from {args.clients} clients: "
+          f"{result['requests_per_s']:.1f} req/s, {result['errors']} errors")
+    for name, st in result["endpoints"].items():
+        print(f"  {name:12s} n={st['count']:6d}  p50 {st['p50_ms']:7.2f} ms  p95 {st['p95_ms']:7.2f} ms  "
+              f"p99 {st['p99_ms']:7.2f} ms")
+    for key, n in result["error_details"].items():
+        print(f"  error {key}: {n}")
+
+
+if __name__ == "__main__":
+    main()
@@ -3,12 +3,47 @@ from __future__ import annotations
 from datetime import datetime, date
 import calendar as _cal
 import hashlib
+import math
 import random
+import re
 import string
-from typing import Optional, List, Tuple
-from database import get_connection, init_db
+import threading
+from typing import Optional, List, Tuple, Iterator, Iterable, Callable
+from database import get_connection, transaction, explain_query_plan, retry_on_busy, data_changed, JULIAN_DAY_OFFSET
 
-init_db()
+# ---------- Storage format ----------
+# expenses stocheaza amount_cents INTEGER (bani) si day INTEGER (date.toordinal());
+# API-ul acestui modul ramane in RON (float) si 'YYYY-MM-DD', conversia se face aici.
+_SQL_DATE = f"date(day + {JULIAN_DAY_OFFSET})"
+_SQL_EXPENSE_COLUMNS = f"id, user_id, amount_cents / 100.0, category, {_SQL_DATE}, description"
+
+
+def _to_cents(amount) -> int:
+    value = float(amount)
+    if not math.isfinite(value):
+        raise ValueError(f"invalid amount: {amount!r}")
+    return round(value * 100)
+
+
+def _remaining(budget: float, spent_cents: int) -> float:
+    # in bani, apoi o singura impartire: 1000 - 3947.48 nu mai da -3947.4799999999996
+    return (_to_cents(budget) - spent_cents) / 100
+
+
+def _to_day(date_str: str) -> int:
+    date_str = str(date_str).strip()
+    # fromisoformat e mult mai rapid decat strptime; lungimea + separatorii impun exact YYYY-MM-DD
+    if len(date_str) != 10 or date_str[4] != "-" or date_str[7] != "-":
+        raise ValueError("date must be YYYY-MM-DD")
+    return date.fromisoformat(date_str).toordinal()
+
+
+# ---------- SQL for the hot paths (checked by check_query_plans) ----------
+_SQL_ALL_EXPENSES = f"SELECT {_SQL_EXPENSE_COLUMNS} FROM expenses WHERE user_id=? ORDER BY day DESC, id DESC"
+# sumele pe interval citesc rollup-ul zilnic (expense_daily), nu randurile brute
+# emailurile sunt salvate normalizate (create_user + migrarea din init_db) -> cautare pe indexul UNIQUE
+_SQL_USER_BY_EMAIL = "SELECT id, password, is_admin FROM users WHERE email=?"
+_SQL_SUM_RANGE = "SELECT COALESCE(SUM(total_cents), 0) FROM expense_daily WHERE user_id=? AND day >= ? AND day < ?"
 
 
 # ---------- helpers ----------
@@ -21,32 +56,27 @@ def _normalize_email(email: str) -> str:
 
 
 # ---------- Users ----------
+@retry_on_busy()
 def create_user(email: str, password: str, is_admin: int = 0) -> int:
     email_n = _normalize_email(email)
     password = password.strip()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO users (email, password, created_at, is_admin) VALUES (?, ?, ?, ?)",
-        (email_n, _hash_password(password), datetime.now().isoformat(), int(is_admin))
-    )
-    conn.commit()
-    uid = cur.lastrowid
-    # initialize default settings for this user
-    cur.execute("INSERT OR IGNORE INTO user_settings (user_id, payday, monthly_budget) VALUES (?, 1, 0)", (uid,))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute(
+            "INSERT INTO users (email, password, created_at, is_admin) VALUES (?, ?, ?, ?)",
+            (email_n, _hash_password(password), datetime.now().isoformat(), int(is_admin))
+        )
+        uid = cur.lastrowid
+        # initialize default settings for this user
+        cur.execute("INSERT OR IGNORE INTO user_settings (user_id, payday, monthly_budget) VALUES (?, 1, 0)", (uid,))
     return uid
 
 
 def authenticate_user(email: str, password: str) -> Optional[Tuple[int, int]]:
     email_n = _normalize_email(email)
     password = password.strip()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, password, is_admin FROM users WHERE lower(email)=?", (email_n,))
-    row = cur.fetchone()
-    conn.close()
+    with transaction() as conn:
+        row = conn.execute(_SQL_USER_BY_EMAIL, (email_n,)).fetchone()
     if not row:
         return None
     uid, stored_hash, is_admin = row
@@ -54,37 +84,93 @@ def authenticate_user(email: str, password: str) -> Optional[Tuple[int, int]]:
 
 
 def list_users() -> List[Tuple[int, str, str, str, int]]:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id, email, password, created_at, is_admin FROM users ORDER BY id ASC")
-    rows = cur.fetchall()
-    conn.close()
-    return rows
-
-
+    with transaction() as conn:
+        return conn.execute("SELECT id, email, password, created_at, is_admin FROM users ORDER BY id ASC").fetchall()
+
+
+def _directory_filters(search: Optional[str], admins_only: bool) -> Tuple[List[str], List]:
+    where, params = ["1=1"], []
+    prefix = _normalize_email(search or "")
+    if prefix:
+        # cautare dupa prefix ca interval pe indexul UNIQUE(email): [prefix, prefix cu ultimul caracter +1)
+        where.append("email >= ? AND email < ?")
+        params += [prefix, prefix[:-1] + chr(ord(prefix[-1]) + 1)]
+    if admins_only:
+        where.append("is_admin=1")
+    return where, params
+
+
+def list_user_directory(
+    search: Optional[str] = None,
+    admins_only: bool = False,
+    limit: int = 100,
+    after: Optional[str] = None,
+    offset: int = 0,
+) -> Tuple[List[Tuple], Optional[str]]:
+    """
+    One page of the admin user directory, ordered by email (keyset on email).
+    Rows: (id, email, created_at, is_admin, expense_count, total_spent, last_activity).
+    The per-user aggregates come from the expense_daily rollup, joined only for the page's users.
+    Returns (rows, next_key); next_key is None on the last page.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    where, params = _directory_filters(search, admins_only)
+    if after is not None:
+        where.append("email > ?")
+        params.append(after)
+        offset = 0
+    sql = f"""
+        WITH page AS (
+            SELECT id, email, created_at, is_admin FROM users
+            WHERE {' AND '.join(where)} ORDER BY email LIMIT ? OFFSET ?
+        )
+        SELECT p.id, p.email, p.created_at, p.is_admin,
+               COALESCE(SUM(d.n), 0), COALESCE(SUM(d.total_cents), 0) / 100.0,
+               date(MAX(d.day) + {JULIAN_DAY_OFFSET})
+        FROM page p LEFT JOIN expense_daily d ON d.user_id = p.id
+        GROUP BY p.id ORDER BY p.email
+    """
+    params += [limit + 1, offset]
+    with transaction() as conn:
+        rows = conn.execute(sql, params).fetchall()
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    return rows, rows[-1][1]
+
+
+def count_user_directory(search: Optional[str] = None, admins_only: bool = False,
+                         limit: Optional[int] = None) -> int:
+    """Matching users; with `limit`, counting stops there (min(count, limit)), so the cost does not grow with the table."""
+    where, params = _directory_filters(search, admins_only)
+    sql = f"SELECT 1 FROM users WHERE {' AND '.join(where)}"
+    if limit is not None:
+        sql += " LIMIT ?"
+        params.append(limit)
+    with transaction() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM ({sql})", params).fetchone()[0]
+
+
+@retry_on_busy()
 def promote_user_to_admin(user_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("UPDATE users SET is_admin=1 WHERE id=?", (user_id,))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as conn:
+        conn.execute("UPDATE users SET is_admin=1 WHERE id=?", (user_id,))
 
 
+@retry_on_busy()
 def ensure_default_admin(email: str = "admin@local", password: str = "admin123") -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM users WHERE is_admin=1 LIMIT 1")
-    has_admin = cur.fetchone()
-    if not has_admin:
-        cur.execute(
-            "INSERT INTO users (email, password, created_at, is_admin) VALUES (?, ?, ?, 1)",
-            (_normalize_email(email), _hash_password(password.strip()), datetime.now().isoformat())
-        )
-        conn.commit()
-        # default settings for admin if missing
-        cur.execute("INSERT OR IGNORE INTO user_settings (user_id, payday, monthly_budget) VALUES ((SELECT id FROM users WHERE is_admin=1 LIMIT 1), 1, 0)")
-        conn.commit()
-    conn.close()
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE is_admin=1 LIMIT 1")
+        has_admin = cur.fetchone()
+        if not has_admin:
+            cur.execute(
+                "INSERT INTO users (email, password, created_at, is_admin) VALUES (?, ?, ?, 1)",
+                (_normalize_email(email), _hash_password(password.strip()), datetime.now().isoformat())
+            )
+            # default settings for admin if missing
+            cur.execute("INSERT OR IGNORE INTO user_settings (user_id, payday, monthly_budget) VALUES ((SELECT id FROM users WHERE is_admin=1 LIMIT 1), 1, 0)")
 
 
 # ---------- Password reset (local/demo) ----------
@@ -93,95 +179,387 @@ def _gen_temp_password(length: int = 8) -> str:
     return "".join(random.choice(alphabet) for _ in range(length))
 
 
+@retry_on_busy()
 def reset_password_local(email: str) -> Optional[str]:
     email_n = _normalize_email(email)
     tmp = _gen_temp_password(8)
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("SELECT id FROM users WHERE lower(email)=?", (email_n,))
-    row = cur.fetchone()
-    if not row:
-        conn.close()
-        return None
-    cur.execute("UPDATE users SET password=? WHERE lower(email)=?", (_hash_password(tmp), email_n))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as conn:
+        cur = conn.cursor()
+        cur.execute("SELECT id FROM users WHERE email=?", (email_n,))
+        row = cur.fetchone()
+        if not row:
+            return None
+        cur.execute("UPDATE users SET password=? WHERE id=?", (_hash_password(tmp), row[0]))
     return tmp
 
 
 # ---------- User settings (payday + monthly budget) ----------
+# user_id -> (payday, monthly_budget); invalidat/actualizat de update_user_settings
+_settings_cache: dict = {}
+_settings_cache_lock = threading.Lock()
+_settings_cache_versions: dict = {}  # user_id -> nr. de scrieri; evita salvarea unei citiri depasite
+
+
+def _cache_version(versions: dict, user_id: int) -> Tuple[int, int]:
+    # cheia None numara golirile complete (toti utilizatorii)
+    return versions.get(None, 0), versions.get(user_id, 0)
+
+
+@retry_on_busy()
 def get_user_settings(user_id: int) -> Tuple[int, float]:
     """
-    Returns (payday, monthly_budget). Ensures a row exists.
+    Returns (payday, monthly_budget).
+    Pure read served from a process-level cache; the default row is inserted only
+    the first time a user without settings is seen.
     """
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("INSERT OR IGNORE INTO user_settings (user_id, payday, monthly_budget) VALUES (?, 1, 0)", (user_id,))
-    conn.commit()
-    cur.execute("SELECT payday, monthly_budget FROM user_settings WHERE user_id=?", (user_id,))
-    row = cur.fetchone()
-    conn.close()
+    check_external_changes()
+    with _settings_cache_lock:
+        cached = _settings_cache.get(user_id)
+        if cached is not None:
+            return cached
+        version = _cache_version(_settings_cache_versions, user_id)
+    sql = "SELECT payday, monthly_budget FROM user_settings WHERE user_id=?"
+    row = get_connection().execute(sql, (user_id,)).fetchone()
+    if row is None:
+        # scriere separata, nu in tranzactia de citire a apelantului (upgrade-ul la scriere poate da BUSY)
+        with transaction(immediate=True) as conn:
+            conn.execute("INSERT OR IGNORE INTO user_settings (user_id, payday, monthly_budget) VALUES (?, 1, 0)", (user_id,))
+            row = conn.execute(sql, (user_id,)).fetchone()
     payday, budget = row
-    return int(payday), float(budget)
+    settings = (int(payday), float(budget))
+    with _settings_cache_lock:
+        if _cache_version(_settings_cache_versions, user_id) == version:
+            _settings_cache[user_id] = settings
+    return settings
 
 
+@retry_on_busy()
 def update_user_settings(user_id: int, payday: int, monthly_budget: float) -> None:
     payday = max(1, min(31, int(payday)))
     monthly_budget = float(monthly_budget)
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO user_settings (user_id, payday, monthly_budget) VALUES (?, ?, ?) "
-        "ON CONFLICT(user_id) DO UPDATE SET payday=excluded.payday, monthly_budget=excluded.monthly_budget",
-        (user_id, payday, monthly_budget)
-    )
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as conn:
+        conn.execute(
+            "INSERT INTO user_settings (user_id, payday, monthly_budget) VALUES (?, ?, ?) "
+            "ON CONFLICT(user_id) DO UPDATE SET payday=excluded.payday, monthly_budget=excluded.monthly_budget",
+            (user_id, payday, monthly_budget)
+        )
+    with _settings_cache_lock:
+        _settings_cache_versions[user_id] = _settings_cache_versions.get(user_id, 0) + 1
+        _settings_cache[user_id] = (payday, monthly_budget)
+    _cycle_cache_settings_changed(user_id, payday, monthly_budget)
 
 
 # ---------- Expenses ----------
+@retry_on_busy()
 def add_expense(user_id: int, amount: float, category: str, date_str: str, description: str = "") -> int:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "INSERT INTO expenses (user_id, amount, category, date, description) VALUES (?, ?, ?, ?, ?)",
-        (user_id, amount, category.strip(), date_str.strip(), description.strip())
-    )
-    conn.commit()
-    eid = cur.lastrowid
-    conn.close()
+    cents, day = _to_cents(amount), _to_day(date_str)
+    with transaction(immediate=True) as conn:
+        cur = conn.execute(
+            "INSERT INTO expenses (user_id, amount_cents, category, day, description) VALUES (?, ?, ?, ?, ?)",
+            (user_id, cents, category.strip(), day, description.strip())
+        )
+        eid = cur.lastrowid
+    _cycle_cache_apply(user_id, day, cents)
+    _notify_expense_change("insert", user_id, (eid, cents / 100, category.strip(), date_str.strip()))
     return eid
 
 
+def _validate_expense_row(n: int, row: Tuple) -> Tuple[int, str, int, str]:
+    """
+    Convert one (amount, category, date, description) row to the stored
+    (amount_cents, category, day, description); raises ValueError naming row `n`.
+    """
+    try:
+        amount, category, date_str = row[0], row[1], row[2]
+        description = row[3] if len(row) > 3 else ""
+        cents, day = _to_cents(amount), _to_day(date_str)
+    except (ValueError, TypeError, IndexError, OverflowError) as e:
+        raise ValueError(f"Row {n}: invalid expense {row!r} ({e})") from None
+    category = str(category or "").strip()
+    if not category:
+        raise ValueError(f"Row {n}: missing category")
+    return cents, category, day, str(description or "").strip()
+
+
+def add_expenses_bulk(
+    user_id: int,
+    rows: Iterable[Tuple],
+    batch_size: int = 5000,
+    progress: Optional[Callable[[int], None]] = None,
+) -> int:
+    """
+    Insert many (amount, category, date, description) rows in ONE transaction,
+    with executemany per batch. Each batch is validated before it is written; any
+    invalid row raises ValueError and rolls back the whole import.
+    progress(rows_done) is called after each batch. Returns the number of rows inserted.
+    """
+    done = 0
+    batch: List[Tuple] = []
+    sql = "INSERT INTO expenses (user_id, amount_cents, category, day, description) VALUES (?, ?, ?, ?, ?)"
+
+    def flush(conn) -> None:
+        nonlocal done
+        valid = [(user_id, *_validate_expense_row(done + i + 1, r)) for i, r in enumerate(batch)]
+        conn.executemany(sql, valid)
+        done += len(batch)
+        batch.clear()
+        if progress:
+            progress(done)
+
+    # fara retry_on_busy: `rows` poate fi un generator deja consumat; BEGIN IMMEDIATE asteapta busy_timeout
+    with transaction(immediate=True) as conn:
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= batch_size:
+                flush(conn)
+        if batch:
+            flush(conn)
+    clear_cycle_cache(user_id)
+    _notify_expense_change("reset", user_id)
+    return done
+
+
 def get_all_expenses(user_id: int) -> List[Tuple]:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT id, user_id, amount, category, date, description FROM expenses WHERE user_id=? ORDER BY date DESC, id DESC",
-        (user_id,)
+    with transaction() as conn:
+        return conn.execute(_SQL_ALL_EXPENSES, (user_id,)).fetchall()
+
+
+# sort_field -> (coloana stocata, index in tuplul rezultat, conversie a cheii `after` in forma stocata)
+_SORT_COLUMNS = {
+    "date": ("day", 4, _to_day),
+    "amount": ("amount_cents", 2, _to_cents),
+    "category": ("category", 3, str),
+}
+_SQL_SEARCH_IDS = "id IN (SELECT rowid FROM expenses_fts WHERE expenses_fts MATCH ?)"
+
+
+def iter_expense_chunks(
+    user_id: int,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    chunk_size: int = 1000,
+) -> Iterator[List[Tuple]]:
+    """
+    Stream the user's expenses (date DESC, id DESC) in lists of at most `chunk_size` rows.
+    from_date/to_date are inclusive and filtered in SQL, so memory stays bounded by the chunk.
+    """
+    where, params = _expense_filters(user_id, None, from_date, to_date)
+    # cursor dedicat, in afara lui transaction(): scrierile facute intre chunk-uri nu asteapta exportul
+    cur = get_connection().cursor()
+    try:
+        cur.execute(
+            f"SELECT {_SQL_EXPENSE_COLUMNS} FROM expenses WHERE {' AND '.join(where)} ORDER BY day DESC, id DESC",
+            params
+        )
+        while True:
+            rows = cur.fetchmany(chunk_size)
+            if not rows:
+                break
+            yield rows
+    finally:
+        cur.close()
+
+
+def _fts_query(search: str) -> Optional[str]:
+    """
+    Turn search-box text into an FTS5 MATCH expression: "quoted text" is matched as a phrase,
+    every other word as a prefix (netfl -> netflix); all parts must match. None if nothing searchable.
+    """
+    parts = []
+    for phrase, word in re.findall(r'"([^"]*)"|(\S+)', search):
+        text = phrase or word
+        if not re.search(r"\w", text):
+            continue
+        quoted = '"' + text.replace('"', '""') + '"'
+        parts.append(quoted if phrase else quoted + "*")
+    return " AND ".join(parts) or None
+
+
+def _expense_filters(
+    user_id: int,
+    category: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    search: Optional[str] = None,
+) -> Tuple[List[str], List]:
+    """WHERE clauses + params shared by query_expenses and count_expenses."""
+    where, params = ["user_id=?"], [user_id]
+    if category:
+        where.append("category=?")
+        params.append(category)
+    if from_date:
+        where.append("day >= ?")
+        params.append(_to_day(from_date))
+    if to_date:
+        where.append("day <= ?")
+        params.append(_to_day(to_date))
+    match = _fts_query(search) if search else None
+    if match:
+        where.append(_SQL_SEARCH_IDS)
+        params.append(match)
+    return where, params
+
+
+def query_expenses(
+    user_id: int,
+    category: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    sort_field: str = "date",
+    order: str = "DESC",
+    limit: int = 100,
+    after: Optional[Tuple] = None,
+    offset: int = 0,
+    search: Optional[str] = None,
+) -> Tuple[List[Tuple], Optional[Tuple]]:
+    """
+    Return one page of expenses filtered and sorted in SQL, plus the continuation key.
+    from_date/to_date are inclusive YYYY-MM-DD strings; pass the returned key as `after`
+    to get the next page (keyset pagination on (sort_field, id)). The key is None on the last page.
+    `offset` is only used without `after`, for jumping to an arbitrary position.
+    `search` filters descriptions through the FTS5 index (see _fts_query); with
+    sort_field="relevance" the best matches come first and pages always use `offset`.
+    """
+    if limit < 1:
+        raise ValueError("limit must be at least 1")
+    if sort_field == "relevance":
+        return _query_expenses_ranked(user_id, category, from_date, to_date, search, limit, offset)
+    sql, params = _page_sql(user_id, category, from_date, to_date, sort_field, order, limit, after, offset, search)
+    with transaction() as conn:
+        rows = conn.execute(sql, params).fetchall()
+
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    return rows, (last[_SORT_COLUMNS[sort_field][1]], last[0])
+
+
+def _page_sql(
+    user_id: int,
+    category: Optional[str],
+    from_date: Optional[str],
+    to_date: Optional[str],
+    sort_field: str,
+    order: str,
+    limit: int,
+    after: Optional[Tuple],
+    offset: int,
+    search: Optional[str],
+) -> Tuple[str, List]:
+    """SQL + params of one query_expenses page (limit + 1 rows, to know if there is a next page)."""
+    if sort_field not in _SORT_COLUMNS:
+        raise ValueError(f"Unknown sort field: {sort_field}")
+    direction = "DESC" if order.upper() == "DESC" else "ASC"
+    column, _key_index, to_stored = _SORT_COLUMNS[sort_field]
+
+    where, params = _expense_filters(user_id, category, from_date, to_date, search)
+    if after is not None:
+        where.append(f"({column}, id) {'<' if direction == 'DESC' else '>'} (?, ?)")
+        params.extend((to_stored(after[0]), after[1]))
+        offset = 0
+
+    sql = (
+        f"SELECT {_SQL_EXPENSE_COLUMNS} FROM expenses "
+        f"WHERE {' AND '.join(where)} ORDER BY {column} {direction}, id {direction} LIMIT ? OFFSET ?"
     )
-    rows = cur.fetchall()
-    conn.close()
-    return rows
+    params.extend((limit + 1, offset))
+    return sql, params
+
+
+def _query_expenses_ranked(
+    user_id: int,
+    category: Optional[str],
+    from_date: Optional[str],
+    to_date: Optional[str],
+    search: Optional[str],
+    limit: int,
+    offset: int,
+) -> Tuple[List[Tuple], Optional[Tuple]]:
+    """query_expenses ordered by FTS5 rank (bm25); without a search it falls back to date DESC."""
+    match = _fts_query(search) if search else None
+    if not match:
+        return query_expenses(user_id, category, from_date, to_date, "date", "DESC", limit, None, offset)
+    # rangul se calculeaza oricum pentru toate potrivirile, deci paginile merg pe OFFSET, fara cheie
+    where, params = _expense_filters(user_id, category, from_date, to_date)
+    sql = (
+        f"SELECT e.id, e.user_id, e.amount_cents / 100.0, e.category, date(e.day + {JULIAN_DAY_OFFSET}), "
+        "e.description FROM expenses_fts JOIN expenses e ON e.id = expenses_fts.rowid "
+        f"WHERE expenses_fts MATCH ? AND {' AND '.join('e.' + w for w in where)} "
+        "ORDER BY expenses_fts.rank, e.id LIMIT ? OFFSET ?"
+    )
+    with transaction() as conn:
+        rows = conn.execute(sql, [match, *params, limit, offset]).fetchall()
+    return rows, None
+
+
+def count_expenses(
+    user_id: int,
+    category: Optional[str] = None,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    search: Optional[str] = None,
+) -> int:
+    where, params = _expense_filters(user_id, category, from_date, to_date, search)
+    with transaction() as conn:
+        return conn.execute(f"SELECT COUNT(*) FROM expenses WHERE {' AND '.join(where)}", params).fetchone()[0]
 
 
+@retry_on_busy()
 def update_expense(expense_id: int, user_id: int, amount: float, category: str, date_str: str, description: str = "") -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "UPDATE expenses SET amount=?, category=?, date=?, description=? WHERE id=? AND user_id=?",
-        (amount, category.strip(), date_str.strip(), description.strip(), expense_id, user_id)
-    )
-    conn.commit()
-    conn.close()
+    cents, day = _to_cents(amount), _to_day(date_str)
+    with transaction(immediate=True) as conn:
+        old = conn.execute(
+            "SELECT amount_cents, day FROM expenses WHERE id=? AND user_id=?", (expense_id, user_id)
+        ).fetchone()
+        conn.execute(
+            "UPDATE expenses SET amount_cents=?, category=?, day=?, description=? WHERE id=? AND user_id=?",
+            (cents, category.strip(), day, description.strip(), expense_id, user_id)
+        )
+    if old:
+        _cycle_cache_apply(user_id, old[1], -old[0])
+        _cycle_cache_apply(user_id, day, cents)
+        _notify_expense_change("update", user_id, (expense_id, cents / 100, category.strip(), date_str.strip()))
 
 
+@retry_on_busy()
 def delete_expense(expense_id: int, user_id: int) -> None:
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute("DELETE FROM expenses WHERE id=? AND user_id=?", (expense_id, user_id))
-    conn.commit()
-    conn.close()
+    with transaction(immediate=True) as conn:
+        old = conn.execute(
+            "SELECT amount_cents, day FROM expenses WHERE id=? AND user_id=?", (expense_id, user_id)
+        ).fetchone()
+        conn.execute("DELETE FROM expenses WHERE id=? AND user_id=?", (expense_id, user_id))
+    if old:
+        _cycle_cache_apply(user_id, old[1], -old[0])
+        _notify_expense_change("delete", user_id, (expense_id,))
+
+
+# ---------- Expense change listeners ----------
+# callback(event, user_id, row): event in {"insert", "update", "delete", "reset"};
+# row = (id, amount, category, date) pentru insert/update, (id,) pentru delete, None pentru reset
+_expense_listeners: List[Callable] = []
+
+
+def add_expense_listener(callback: Callable[[str, Optional[int], Optional[Tuple]], None]) -> None:
+    """
+    Be told about every committed expense write (used to patch in-memory views such as snapshot.py).
+    A "reset" with user_id None means another process wrote: drop everything.
+    """
+    if callback not in _expense_listeners:
+        _expense_listeners.append(callback)
+
+
+def remove_expense_listener(callback: Callable) -> None:
+    if callback in _expense_listeners:
+        _expense_listeners.remove(callback)
+
+
+def _notify_expense_change(event: str, user_id: Optional[int], row: Optional[Tuple] = None) -> None:
+    for callback in list(_expense_listeners):
+        try:
+            callback(event, user_id, row)
+        except Exception as e:  # un listener stricat nu trebuie sa anuleze o scriere deja confirmata
+            print(f"Expense listener failed: {e}")
 
 
 # ---------- Cycle math ----------
@@ -218,26 +596,228 @@ def get_cycle_bounds(payday: int, ref: Optional[date] = None) -> Tuple[date, dat
 
 def get_sum_expenses_in_range(user_id: int, start: date, end_excl: date) -> float:
     """
-    Sum expenses for [start, end_excl) using ISO dates.
+    Sum expenses for [start, end_excl), in RON.
     """
-    s, e = start.isoformat(), end_excl.isoformat()
-    conn = get_connection()
-    cur = conn.cursor()
-    cur.execute(
-        "SELECT COALESCE(SUM(amount), 0) FROM expenses WHERE user_id=? AND date >= ? AND date < ?",
-        (user_id, s, e)
-    )
-    total = cur.fetchone()[0] or 0.0
-    conn.close()
-    return float(total)
+    return _sum_cents_in_range(user_id, start, end_excl) / 100
+
+
+def _sum_cents_in_range(user_id: int, start: date, end_excl: date) -> int:
+    with transaction() as conn:
+        return conn.execute(_SQL_SUM_RANGE, (user_id, start.toordinal(), end_excl.toordinal())).fetchone()[0]
+
+
+# ---------- Cycle cache (budget badge) ----------
+# user_id -> {"payday", "budget", "start", "end", "spent_cents"}; actualizat in loc la fiecare scriere
+_cycle_cache: dict = {}
+_cycle_cache_lock = threading.Lock()
+_cycle_cache_versions: dict = {}  # user_id -> nr. de scrieri; evita salvarea unui calcul depasit
+_cycle_cache_stats = {"hits": 0, "misses": 0}
+
+
+def _cycle_cache_apply(user_id: int, day: int, delta_cents: int) -> None:
+    """Add `delta_cents` to the cached spent amount if `day` (ordinal) falls in the cached cycle."""
+    with _cycle_cache_lock:
+        _cycle_cache_versions[user_id] = _cycle_cache_versions.get(user_id, 0) + 1
+        entry = _cycle_cache.get(user_id)
+        if entry and entry["start"].toordinal() <= day < entry["end"].toordinal():
+            entry["spent_cents"] += delta_cents
+
+
+def _cycle_cache_settings_changed(user_id: int, payday: int, budget: float) -> None:
+    with _cycle_cache_lock:
+        _cycle_cache_versions[user_id] = _cycle_cache_versions.get(user_id, 0) + 1
+        entry = _cycle_cache.get(user_id)
+        if entry and entry["payday"] == payday:
+            entry["budget"] = budget
+        else:
+            # alt payday -> alte limite de ciclu, recalculam la urmatoarea citire
+            _cycle_cache.pop(user_id, None)
+
+
+def clear_cycle_cache(user_id: Optional[int] = None) -> None:
+    with _cycle_cache_lock:
+        if user_id is None:
+            _cycle_cache.clear()
+        else:
+            _cycle_cache.pop(user_id, None)
+        _cycle_cache_versions[user_id] = _cycle_cache_versions.get(user_id, 0) + 1
+
+
+def check_external_changes() -> bool:
+    """
+    Drop the settings and cycle caches and reset the expense listeners (snapshots) if another
+    process committed to the database since the last check (PRAGMA data_version).
+    Called before serving a cache hit.
+    """
+    if not data_changed():
+        return False
+    with _settings_cache_lock:
+        _settings_cache.clear()
+        _settings_cache_versions[None] = _settings_cache_versions.get(None, 0) + 1
+    clear_cycle_cache()
+    _notify_expense_change("reset", None)
+    return True
+
+
+def get_cycle_cache_stats() -> dict:
+    with _cycle_cache_lock:
+        return {**_cycle_cache_stats, "size": len(_cycle_cache)}
 
 
 def get_cycle_remaining(user_id: int, ref: Optional[date] = None) -> Tuple[float, float, date, date]:
     """
     Return (remaining, spent, start, end_exclusive) for current cycle based on user's settings.
+    Served from the per-user cycle cache when `ref` falls in the cached cycle (no DB access).
     """
+    day = ref or date.today()
+    check_external_changes()
+    with _cycle_cache_lock:
+        entry = _cycle_cache.get(user_id)
+        if entry and entry["start"] <= day < entry["end"]:
+            _cycle_cache_stats["hits"] += 1
+            cents = entry["spent_cents"]
+            return _remaining(entry["budget"], cents), cents / 100, entry["start"], entry["end"]
+        _cycle_cache_stats["misses"] += 1
+        version = _cache_version(_cycle_cache_versions, user_id)
+
     payday, budget = get_user_settings(user_id)
+    start, end = get_cycle_bounds(payday, day)
+    spent_cents = _sum_cents_in_range(user_id, start, end)
+
+    with _cycle_cache_lock:
+        if _cache_version(_cycle_cache_versions, user_id) == version:
+            _cycle_cache[user_id] = {"payday": payday, "budget": budget, "start": start, "end": end,
+                                     "spent_cents": spent_cents}
+    return _remaining(budget, spent_cents), spent_cents / 100, start, end
+
+
+def get_cycle_history(user_id: int, n: int = 12, ref: Optional[date] = None) -> List[Tuple[date, date, float, float, float]]:
+    """
+    Return [(start, end_exclusive, spent, budget, remaining)] for the last `n` salary cycles
+    (the one containing `ref` included), oldest first.
+    The limits come from get_cycle_bounds; the sums from one GROUP BY over expense_daily,
+    joined to a VALUES list with the cycle limits (one range seek per cycle).
+    The budget is the current monthly_budget (older budgets are not kept).
+    """
+    if n < 1:
+        return []
+    payday, budget = get_user_settings(user_id)  # inaintea tranzactiei: poate scrie randul implicit
+    bounds = [get_cycle_bounds(payday, ref)]
+    while len(bounds) < n:
+        bounds.append(get_cycle_bounds(payday, date.fromordinal(bounds[-1][0].toordinal() - 1)))
+    bounds.reverse()
+    with transaction() as conn:
+        values = ", ".join("(?, ?, ?)" for _ in bounds)
+        params: List = []
+        for k, (start, end) in enumerate(bounds):
+            params += [k, start.toordinal(), end.toordinal()]
+        rows = conn.execute(
+            f"WITH cycles(k, start, end_excl) AS (VALUES {values}) "
+            "SELECT c.k, COALESCE(SUM(d.total_cents), 0) FROM cycles c "
+            "LEFT JOIN expense_daily d ON d.user_id = ? AND d.day >= c.start AND d.day < c.end_excl "
+            "GROUP BY c.k ORDER BY c.k",
+            params + [user_id],
+        ).fetchall()
+
+    history = []
+    for (start, end), (_k, spent_cents) in zip(bounds, rows):
+        history.append((start, end, spent_cents / 100, budget, _remaining(budget, spent_cents)))
+    return history
+
+
+# ---------- Aggregates ----------
+def get_expense_summary(
+    user_id: int,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    ref: Optional[date] = None,
+    include_daily: bool = False,
+) -> dict:
+    """
+    Totals for [from_date, to_date] (inclusive, optional) plus the current salary cycle,
+    computed by a single GROUP BY round trip over the expense_daily rollup:
+      total, count, per_category {cat: (sum, count)}, per_day {YYYY-MM-DD: sum} (if include_daily),
+      payday, budget, cycle_start, cycle_end (exclusive), cycle_spent, cycle_remaining
+    """
+    payday, budget = get_user_settings(user_id)  # inaintea tranzactiei: poate scrie randul implicit
     start, end = get_cycle_bounds(payday, ref)
-    spent = get_sum_expenses_in_range(user_id, start, end)
-    remaining = float(budget) - float(spent)
-    return remaining, spent, start, end
+    with transaction() as conn:
+        where, params = _expense_filters(user_id, None, from_date, to_date)
+        cond = " AND ".join(where)
+        parts = [f"SELECT 'cat', category, SUM(total_cents), SUM(n) FROM expense_daily WHERE {cond} GROUP BY category"]
+        all_params = list(params)
+        if include_daily:
+            parts.append(
+                f"SELECT 'day', {_SQL_DATE}, SUM(total_cents), SUM(n) FROM expense_daily WHERE {cond} GROUP BY day"
+            )
+            all_params += params
+        parts.append(
+            "SELECT 'cycle', NULL, COALESCE(SUM(total_cents), 0), COALESCE(SUM(n), 0) FROM expense_daily "
+            "WHERE user_id=? AND day >= ? AND day < ?"
+        )
+        all_params += [user_id, start.toordinal(), end.toordinal()]
+        rows = conn.execute(" UNION ALL ".join(parts), all_params).fetchall()
+
+    # sumele in bani sunt exacte; impartim la 100 o singura data, la iesire
+    per_category, per_day, cycle_cents, total_cents = {}, {}, 0, 0
+    for kind, key, cents, count in rows:
+        if kind == "cat":
+            per_category[key] = (cents / 100, int(count))
+            total_cents += cents
+        elif kind == "day":
+            per_day[key] = cents / 100
+        else:
+            cycle_cents = cents
+    return {
+        "total": total_cents / 100,
+        "count": sum(n for _, n in per_category.values()),
+        "per_category": per_category,
+        "per_day": per_day,
+        "payday": payday,
+        "budget": budget,
+        "cycle_start": start,
+        "cycle_end": end,
+        "cycle_spent": cycle_cents / 100,
+        "cycle_remaining": _remaining(budget, cycle_cents),
+    }
+
+
+# ---------- Query plan check ----------
+def check_query_plans() -> dict:
+    """
+    Run EXPLAIN QUERY PLAN on the hot queries and make sure they seek an index / primary key
+    (no full table scan, no temp B-tree for sorting).
+    Returns {query_name: [plan lines]}; raises RuntimeError if a plan regressed.
+    """
+    queries = {
+        "authenticate_user": (_SQL_USER_BY_EMAIL, ("a@b.c",), "sqlite_autoindex_users_1"),
+        "get_all_expenses": (_SQL_ALL_EXPENSES, (1,), "idx_expenses_user_date"),
+        "list_user_directory": (
+            "SELECT id, email FROM users WHERE email >= ? AND email < ? AND email > ? ORDER BY email LIMIT ?",
+            ("a", "b", "a", 101), "sqlite_autoindex_users_1"
+        ),
+        # exact SQL-ul construit de query_expenses, pentru fiecare sortare (pagina urmatoare, cu cheie)
+        "query_expenses": (
+            *_page_sql(1, "Altele", "2000-01-01", None, "date", "DESC", 100, ("2000-02-01", 1), 0, None),
+            "idx_expenses_user_"
+        ),
+        "query_expenses_by_amount": (
+            *_page_sql(1, None, None, None, "amount", "DESC", 100, (12.5, 1), 0, None), "idx_expenses_user_amount"
+        ),
+        "query_expenses_by_category": (
+            *_page_sql(1, None, None, None, "category", "ASC", 100, ("Altele", 1), 0, None), "idx_expenses_user_cat_id"
+        ),
+        "query_expenses_search": (
+            f"SELECT id FROM expenses WHERE user_id=? AND {_SQL_SEARCH_IDS} ORDER BY day DESC, id DESC LIMIT ?",
+            (1, '"netflix"*', 101), "expenses_fts VIRTUAL TABLE INDEX"
+        ),
+        "get_sum_expenses_in_range": (_SQL_SUM_RANGE, (1, 730120, 730151), "PRIMARY KEY"),
+    }
+    plans = {}
+    for name, (sql, params, index) in queries.items():
+        plan = explain_query_plan(sql, params)
+        plans[name] = plan
+        text = " ".join(plan)
+        if index not in text or "TEMP B-TREE" in text:
+            raise RuntimeError(f"{name} does not use {index}: {text}")
+    return plans
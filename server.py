@@ -0,0 +1,500 @@
+"""
+Server HTTP/JSON (doar biblioteca standard) peste models.py / utils.py, pentru mai multi clienti simultan.
+
+    python server.py                         # http://127.0.0.1:8765, expenses.db
+    python server.py --port 9000 --workers 32 --db /cale/expenses.db
+
+Autentificare: POST /api/login {"email", "password"} -> {"token"}; apoi header "Authorization: Bearer <token>".
+
+    POST   /api/register                 {"email", "password"}
+    POST   /api/login | /api/logout
+    GET    /api/expenses                 ?category=&from=&to=&search=&sort=date|amount|category|relevance
+                                         &order=ASC|DESC&limit=&offset=&after=<"next" din pagina anterioara>
+    GET    /api/expenses/count           aceleasi filtre
+    GET    /api/expenses/all             ?from=&to=  toate cheltuielile, JSON in flux (chunked)
+    POST   /api/expenses                 {"amount", "category", "date", "description"}
+    PUT    /api/expenses/<id>            idem
+    DELETE /api/expenses/<id>
+    GET    /api/summary                  ?from=&to=&daily=1
+    GET    /api/settings | PUT /api/settings {"payday", "monthly_budget"}
+    GET    /api/cycle
+    GET    /api/cycle/history            ?n=12  ultimele n cicluri de salariu, cel mai vechi primul
+    GET    /api/export.csv | /api/report.txt   ?from=&to=  (in flux)
+    GET    /api/users                    (admin) ?search=&admins_only=1&limit=&after=
+    POST   /api/users/<id>/promote       (admin)
+    GET    /api/stats                    (admin) raportul instrumentation.py
+
+HTTP/1.1 cu keep-alive: fiecare conexiune e servita de un thread din pool (deci cel mult --workers
+conexiuni deschise simultan); fiecare thread are conexiunea lui SQLite (database.get_connection).
+"""
+from __future__ import annotations
+
+import argparse
+import io
+import json
+import re
+import secrets
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from typing import Callable, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+
+import database
+import instrumentation
+import models
+import utils
+
+TOKEN_TTL = 12 * 3600  # secunde
+STREAM_BUFFER = 1 << 16
+
+
+class ApiError(Exception):
+    def __init__(self, status: HTTPStatus, message: str):
+        super().__init__(message)
+        self.status = status
+
+
+# ---------- Sessions ----------
+_sessions: Dict[str, Tuple[int, int, float]] = {}  # token -> (user_id, is_admin, expira_la)
+_sessions_lock = threading.Lock()
+
+
+def _new_session(user_id: int, is_admin: int) -> str:
+    token = secrets.token_urlsafe(24)
+    with _sessions_lock:
+        _sessions[token] = (user_id, is_admin, time.time() + TOKEN_TTL)
+    return token
+
+
+def _session(token: str) -> Optional[Tuple[int, int]]:
+    with _sessions_lock:
+        entry = _sessions.get(token)
+        if entry is None:
+            return None
+        if entry[2] < time.time():
+            del _sessions[token]
+            return None
+        return entry[0], entry[1]
+
+
+# ---------- Chunked responses ----------
+class _ChunkedWriter(io.RawIOBase):
+    """Raw stream that frames every write as one HTTP/1.1 chunk."""
+
+    def __init__(self, wfile):
+        self.wfile = wfile
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, b) -> int:
+        if b:
+            self.wfile.write(b"%x\r\n" % len(b) + bytes(b) + b"\r\n")
+        return len(b)
+
+    def finish(self) -> None:
+        self.wfile.write(b"0\r\n\r\n")
+        self.wfile.flush()
+
+
+def _expense_json(r: Tuple) -> dict:
+    return {"id": r[0], "amount": r[2], "category": r[3], "date": r[4], "description": r[5] or ""}
+
+
+def _expense_payload(body: dict) -> Tuple[float, str, str, str]:
+    try:
+        amount = float(body["amount"])
+        category = str(body["category"]).strip()
+        date_str = str(body["date"]).strip()
+        date.fromisoformat(date_str)
+    except (KeyError, TypeError, ValueError) as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid expense: {e}") from None
+    if len(date_str) != 10 or not category:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "Invalid expense: date must be YYYY-MM-DD and category non-empty")
+    return amount, category, date_str, str(body.get("description") or "")
+
+
+# ---------- Handlers ----------
+# fiecare handler primeste (request, user_id | None, match) si intoarce un obiect JSON sau None (a raspuns singur)
+def _register(req: "ApiHandler", _uid, _m):
+    body = req.json_body()
+    email, password = str(body.get("email", "")).strip(), str(body.get("password", "")).strip()
+    if not email or not password:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "email and password are required")
+    try:
+        return {"id": models.create_user(email, password)}
+    except sqlite3.IntegrityError:
+        raise ApiError(HTTPStatus.CONFLICT, "Email already exists") from None
+
+
+def _login(req: "ApiHandler", _uid, _m):
+    body = req.json_body()
+    res = models.authenticate_user(str(body.get("email", "")), str(body.get("password", "")))
+    if not res:
+        raise ApiError(HTTPStatus.UNAUTHORIZED, "Invalid credentials")
+    user_id, is_admin = res
+    return {"token": _new_session(user_id, is_admin), "user_id": user_id, "is_admin": bool(is_admin)}
+
+
+def _logout(req: "ApiHandler", _uid, _m):
+    with _sessions_lock:
+        _sessions.pop(req.token(), None)
+    return {"ok": True}
+
+
+def _filters(req: "ApiHandler") -> dict:
+    q = req.query
+    return {"category": q.get("category"), "from_date": q.get("from"), "to_date": q.get("to"),
+            "search": q.get("search")}
+
+
+def _limit(req: "ApiHandler") -> int:
+    limit = int(req.query.get("limit", 100))
+    if limit < 1:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "limit must be at least 1")
+    return min(limit, 1000)
+
+
+def _page_key(req: "ApiHandler") -> Optional[tuple]:
+    """?after= of /api/expenses: the JSON "next" of the previous page, i.e. [sort value, id]."""
+    raw = req.query.get("after")
+    if not raw:
+        return None
+    try:
+        after = json.loads(raw)
+    except ValueError:
+        after = None
+    if not (isinstance(after, list) and len(after) == 2
+            and all(isinstance(v, (str, int, float)) and not isinstance(v, bool) for v in after)):
+        raise ApiError(HTTPStatus.BAD_REQUEST, 'after must be the "next" value of the previous page')
+    return tuple(after)
+
+
+def _list_expenses(req: "ApiHandler", uid, _m):
+    q = req.query
+    offset = int(q.get("offset", 0))
+    if offset < 0:
+        raise ApiError(HTTPStatus.BAD_REQUEST, "offset must not be negative")
+    rows, next_key = models.query_expenses(
+        uid, **_filters(req), sort_field=q.get("sort", "date"), order=q.get("order", "DESC"),
+        limit=_limit(req), offset=offset, after=_page_key(req),
+    )
+    return {"rows": [_expense_json(r) for r in rows], "next": None if next_key is None else json.dumps(next_key)}
+
+
+def _count_expenses(req: "ApiHandler", uid, _m):
+    return {"count": models.count_expenses(uid, **_filters(req))}
+
+
+def _date_range(req: "ApiHandler") -> Tuple[Optional[str], Optional[str]]:
+    """?from=&to= checked up front: the streamed routes can no longer answer 400 once the header is sent."""
+    dfrom, dto = req.query.get("from"), req.query.get("to")
+    for d in (dfrom, dto):
+        if d:
+            models._to_day(d)  # ValueError -> 400
+    return dfrom, dto
+
+
+def _stream_all_expenses(req: "ApiHandler", uid, _m):
+    dfrom, dto = _date_range(req)
+    with req.stream("application/json") as out:
+        out.write('{"rows": [')
+        first = True
+        for chunk in models.iter_expense_chunks(uid, dfrom, dto):
+            for r in chunk:
+                out.write(("" if first else ",") + json.dumps(_expense_json(r), ensure_ascii=False))
+                first = False
+        out.write("]}")
+
+
+def _add_expense(req: "ApiHandler", uid, _m):
+    return {"id": models.add_expense(uid, *_expense_payload(req.json_body()))}
+
+
+def _update_expense(req: "ApiHandler", uid, m):
+    models.update_expense(int(m.group(1)), uid, *_expense_payload(req.json_body()))
+    return {"ok": True}
+
+
+def _delete_expense(req: "ApiHandler", uid, m):
+    models.delete_expense(int(m.group(1)), uid)
+    return {"ok": True}
+
+
+# Rezumatele vin din rollup-ul SQL, nu din snapshot-urile utils.expense_summary: acelea raman in
+# memorie cate unul per utilizator, iar serverul ar ajunge sa tina o copie a tuturor cheltuielilor.
+def _summary(req: "ApiHandler", uid, _m):
+    s = models.get_expense_summary(uid, req.query.get("from"), req.query.get("to"),
+                                   include_daily=req.query.get("daily") == "1")
+    s["per_category"] = {cat: {"total": t, "count": n} for cat, (t, n) in s["per_category"].items()}
+    return s
+
+
+def _get_settings(_req, uid, _m):
+    payday, budget = models.get_user_settings(uid)
+    return {"payday": payday, "monthly_budget": budget}
+
+
+def _put_settings(req: "ApiHandler", uid, _m):
+    body = req.json_body()
+    try:
+        models.update_user_settings(uid, int(body["payday"]), float(body["monthly_budget"]))
+    except (KeyError, TypeError, ValueError) as e:
+        raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid settings: {e}") from None
+    return _get_settings(req, uid, None)
+
+
+def _cycle(_req, uid, _m):
+    remaining, spent, start, end = models.get_cycle_remaining(uid)
+    return {"remaining": remaining, "spent": spent, "start": start, "end": end}
+
+
+def _cycle_history(req: "ApiHandler", uid, _m):
+    n = min(int(req.query.get("n", 12)), 120)
+    keys = ("start", "end", "spent", "budget", "remaining")
+    return {"cycles": [dict(zip(keys, c)) for c in models.get_cycle_history(uid, n)]}
+
+
+def _export_csv(req: "ApiHandler", uid, _m):
+    dfrom, dto = _date_range(req)
+    with req.stream("text/csv", filename="expenses.csv") as out:
+        utils.write_csv(uid, out, dfrom, dto)
+
+
+def _report_txt(req: "ApiHandler", uid, _m):
+    dfrom, dto = _date_range(req)
+    summary = models.get_expense_summary(uid, dfrom, dto)  # inainte de antet
+    with req.stream("text/plain", filename="expenses_summary.txt") as out:
+        utils.write_txt_summary(uid, out, dfrom, dto, summary=summary)
+
+
+def _list_users(req: "ApiHandler", _uid, _m):
+    q = req.query
+    rows, next_key = models.list_user_directory(q.get("search"), q.get("admins_only") == "1",
+                                                limit=_limit(req), after=q.get("after"))
+    keys = ("id", "email", "created_at", "is_admin", "expense_count", "total_spent", "last_activity")
+    return {"rows": [dict(zip(keys, r)) for r in rows], "next": next_key}
+
+
+def _promote(_req, _uid, m):
+    models.promote_user_to_admin(int(m.group(1)))
+    return {"ok": True}
+
+
+def _stats(_req, _uid, _m):
+    return instrumentation.report()
+
+
+PUBLIC, USER, ADMIN = 0, 1, 2
+ROUTES: List[Tuple[str, "re.Pattern", Callable, int]] = [
+    (method, re.compile(f"^{path}$"), handler, access)
+    for method, path, handler, access in [
+        ("POST", "/api/register", _register, PUBLIC),
+        ("POST", "/api/login", _login, PUBLIC),
+        ("POST", "/api/logout", _logout, USER),
+        ("GET", "/api/expenses", _list_expenses, USER),
+        ("GET", "/api/expenses/count", _count_expenses, USER),
+        ("GET", "/api/expenses/all", _stream_all_expenses, USER),
+        ("POST", "/api/expenses", _add_expense, USER),
+        ("PUT", r"/api/expenses/(\d+)", _update_expense, USER),
+        ("DELETE", r"/api/expenses/(\d+)", _delete_expense, USER),
+        ("GET", "/api/summary", _summary, USER),
+        ("GET", "/api/settings", _get_settings, USER),
+        ("PUT", "/api/settings", _put_settings, USER),
+        ("GET", "/api/cycle", _cycle, USER),
+        ("GET", "/api/cycle/history", _cycle_history, USER),
+        ("GET", r"/api/export\.csv", _export_csv, USER),
+        ("GET", r"/api/report\.txt", _report_txt, USER),
+        ("GET", "/api/users", _list_users, ADMIN),
+        ("POST", r"/api/users/(\d+)/promote", _promote, ADMIN),
+        ("GET", "/api/stats", _stats, ADMIN),
+    ]
+]
+
+
+class ApiHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"  # keep-alive
+    timeout = 30  # conexiunile inactive elibereaza thread-ul din pool
+    # antetul si corpul pleaca intr-un singur send (wfile cu buffer, golit la sfarsitul cererii);
+    # fara Nagle, raspunsurile mici nu asteapta ACK-ul intarziat al clientului (~40 ms pe keep-alive)
+    wbufsize = -1
+    disable_nagle_algorithm = True
+    server_version = "ExpenseTracker/1.0"
+
+    # ----- helpers -----
+    def json_body(self) -> dict:
+        if not self.body:
+            return {}
+        try:
+            body = json.loads(self.body)
+        except ValueError:
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be JSON") from None
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "Body must be a JSON object")
+        return body
+
+    def token(self) -> str:
+        auth = self.headers.get("Authorization", "")
+        return auth[7:].strip() if auth.startswith("Bearer ") else ""
+
+    def send_json(self, obj, status: HTTPStatus = HTTPStatus.OK) -> None:
+        data = json.dumps(obj, default=str, ensure_ascii=False).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def stream(self, content_type: str, filename: Optional[str] = None) -> "_StreamContext":
+        """Context manager yielding a text stream sent as a chunked response."""
+        return _StreamContext(self, content_type, filename)
+
+    # ----- dispatch -----
+    def _dispatch(self, method: str) -> None:
+        parts = urlsplit(self.path)
+        self.query = {k: v[-1] for k, v in parse_qs(parts.query).items()}
+        self.streaming = False
+        # corpul se citeste mereu, altfel restul lui ar strica urmatoarea cerere de pe conexiune
+        self.body = self.rfile.read(int(self.headers.get("Content-Length") or 0))
+        try:
+            for route_method, pattern, handler, access in ROUTES:
+                m = pattern.match(parts.path)
+                if m and route_method == method:
+                    break
+            else:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"No route for {method} {parts.path}")
+            uid = None
+            if access != PUBLIC:
+                session = _session(self.token())
+                if session is None:
+                    raise ApiError(HTTPStatus.UNAUTHORIZED, "Missing or expired token")
+                uid, is_admin = session
+                if access == ADMIN and not is_admin:
+                    raise ApiError(HTTPStatus.FORBIDDEN, "Admin only")
+            result = handler(self, uid, m)
+            if not self.streaming:
+                self.send_json(result)
+        except ApiError as e:
+            self._fail(e.status, str(e))
+        except (ConnectionError, TimeoutError):
+            self.close_connection = True
+        except ValueError as e:  # parametri invalizi (limit=abc, sort necunoscut, ...)
+            self._fail(HTTPStatus.BAD_REQUEST, str(e))
+        except Exception as e:
+            if isinstance(e, sqlite3.OperationalError) and database.is_busy_error(e):
+                self._fail(HTTPStatus.SERVICE_UNAVAILABLE, "Database busy, retry later")
+                return
+            self.log_error("Unhandled error on %s %s: %r", method, self.path, e)
+            self._fail(HTTPStatus.INTERNAL_SERVER_ERROR, "Internal error")
+
+    def _fail(self, status: HTTPStatus, message: str) -> None:
+        if self.streaming:
+            # antetul a plecat deja; singurul semnal posibil e inchiderea conexiunii
+            self.close_connection = True
+            return
+        self.send_json({"error": message}, status)
+
+    def do_GET(self):
+        self._dispatch("GET")
+
+    def do_POST(self):
+        self._dispatch("POST")
+
+    def do_PUT(self):
+        self._dispatch("PUT")
+
+    def do_DELETE(self):
+        self._dispatch("DELETE")
+
+    def log_request(self, code="-", size="-"):
+        if self.server.verbose:
+            super().log_request(code, size)
+
+
+class _StreamContext:
+    def __init__(self, handler: ApiHandler, content_type: str, filename: Optional[str]):
+        self.handler, self.content_type, self.filename = handler, content_type, filename
+
+    def __enter__(self) -> io.TextIOWrapper:
+        h = self.handler
+        h.send_response(HTTPStatus.OK)
+        h.send_header("Content-Type", f"{self.content_type}; charset=utf-8")
+        h.send_header("Transfer-Encoding", "chunked")
+        if self.filename:
+            h.send_header("Content-Disposition", f'attachment; filename="{self.filename}"')
+        h.end_headers()
+        h.streaming = True
+        self.raw = _ChunkedWriter(h.wfile)
+        self.text = io.TextIOWrapper(io.BufferedWriter(self.raw, STREAM_BUFFER), encoding="utf-8", newline="")
+        return self.text
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        if exc_type is None:
+            self.text.flush()
+            self.raw.finish()
+        self.text.detach()  # nu inchide socket-ul odata cu wrapper-ul
+
+
+class PooledHTTPServer(HTTPServer):
+    """HTTPServer that hands every accepted connection to a fixed thread pool."""
+
+    request_queue_size = 128
+
+    def __init__(self, address, handler, workers: int = 16, verbose: bool = False):
+        super().__init__(address, handler)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="api")
+        self.verbose = verbose
+
+    def process_request(self, request, client_address):
+        self.pool.submit(self._handle, request, client_address)
+
+    def _handle(self, request, client_address):
+        try:
+            self.finish_request(request, client_address)
+        except Exception:
+            self.handle_error(request, client_address)
+        finally:
+            self.shutdown_request(request)
+
+    def server_close(self):
+        super().server_close()
+        self.pool.shutdown(wait=False, cancel_futures=True)
+        database.close_connections()
+
+
+def make_server(host: str = "127.0.0.1", port: int = 8765, workers: int = 16, verbose: bool = False) -> PooledHTTPServer:
+    database.init_db()
+    models.ensure_default_admin()
+    return PooledHTTPServer((host, port), ApiHandler, workers=workers, verbose=verbose)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="JSON API server for the expense tracker.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--workers", type=int, default=16, help="thread-uri in pool (= conexiuni simultane)")
+    parser.add_argument("--db", default=database.DB_NAME)
+    parser.add_argument("--no-instrument", action="store_true", help="fara instrumentation.py (/api/stats gol)")
+    parser.add_argument("--verbose", action="store_true", help="logheaza fiecare cerere")
+    args = parser.parse_args()
+
+    database.DB_NAME = args.db
+    if not args.no_instrument:
+        instrumentation.enable()
+    server = make_server(args.host, args.port, args.workers, args.verbose)
+    print(f"Serving {args.db} on http://{args.host}:{args.port} ({args.workers} workers)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,227 @@
+from __future__ import annotations
+
+import threading
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import models
+from database import get_connection
+
+LOAD_CHUNK = 10000
+
+
+def _ordinal(date_str: Optional[str]) -> Optional[int]:
+    return date.fromisoformat(date_str).toordinal() if date_str else None
+
+
+class ExpenseSnapshot:
+    """
+    Columnar, in-memory copy of one user's expenses for vectorized analytics:
+      ids int64, cents int64, days int32 (date.toordinal()), codes int32 (index in `categories`),
+    i.e. the stored columns (amount_cents, day), so loading needs no parsing and sums stay exact.
+    Loaded in one pass, then patched in place on every insert/update/delete (see models.add_expense_listener).
+    Row order is not meaningful: deletes move the last row into the freed slot.
+    """
+
+    def __init__(self, user_id: int, capacity: int = 1024):
+        self.user_id = user_id
+        self.n = 0
+        self.categories: List[str] = []
+        self._codes: Dict[str, int] = {}
+        self._lock = threading.RLock()
+        self._alloc(max(capacity, 16))
+
+    def _alloc(self, capacity: int) -> None:
+        old = getattr(self, "ids", None)
+        ids = np.empty(capacity, dtype=np.int64)
+        cents = np.empty(capacity, dtype=np.int64)
+        days = np.empty(capacity, dtype=np.int32)
+        codes = np.empty(capacity, dtype=np.int32)
+        if old is not None:
+            ids[:self.n], cents[:self.n] = self.ids[:self.n], self.cents[:self.n]
+            days[:self.n], codes[:self.n] = self.days[:self.n], self.codes[:self.n]
+        self.ids, self.cents, self.days, self.codes = ids, cents, days, codes
+
+    def _code(self, category: str) -> int:
+        code = self._codes.get(category)
+        if code is None:
+            code = self._codes[category] = len(self.categories)
+            self.categories.append(category)
+        return code
+
+    # ----- load -----
+    @classmethod
+    def load(cls, user_id: int) -> "ExpenseSnapshot":
+        conn = get_connection()
+        (count,) = conn.execute("SELECT COUNT(*) FROM expenses WHERE user_id=?", (user_id,)).fetchone()
+        snap = cls(user_id, capacity=count + count // 4)
+        cur = conn.cursor()
+        try:
+            cur.execute("SELECT id, amount_cents, category, day FROM expenses WHERE user_id=?", (user_id,))
+            while True:
+                rows = cur.fetchmany(LOAD_CHUNK)
+                if not rows:
+                    break
+                snap._append_rows(rows)
+        finally:
+            cur.close()
+        return snap
+
+    def _append_rows(self, rows: List[Tuple]) -> None:
+        """Append stored-format rows: (id, amount_cents, category, day)."""
+        ids, cents, cats, days = zip(*rows)
+        k = len(rows)
+        if self.n + k > len(self.ids):
+            self._alloc(max(2 * len(self.ids), self.n + k))
+        end = self.n + k
+        self.ids[self.n:end] = ids
+        self.cents[self.n:end] = cents
+        self.days[self.n:end] = days
+        self.codes[self.n:end] = [self._code(c) for c in cats]
+        self.n = end
+
+    # ----- incremental patches -----
+    def _index(self, expense_id: int) -> int:
+        hit = np.flatnonzero(self.ids[:self.n] == expense_id)
+        return int(hit[0]) if hit.size else -1
+
+    def insert(self, expense_id: int, amount: float, category: str, date_str: str) -> None:
+        with self._lock:
+            self._append_rows([(expense_id, round(amount * 100), category, _ordinal(date_str))])
+
+    def update(self, expense_id: int, amount: float, category: str, date_str: str) -> None:
+        with self._lock:
+            self.delete(expense_id)
+            self._append_rows([(expense_id, round(amount * 100), category, _ordinal(date_str))])
+
+    def delete(self, expense_id: int) -> None:
+        with self._lock:
+            i = self._index(expense_id)
+            if i < 0:
+                return
+            last = self.n - 1
+            for col in (self.ids, self.cents, self.days, self.codes):
+                col[i] = col[last]
+            self.n = last
+
+    # ----- vectorized queries -----
+    def mask(self, from_date: Optional[str] = None, to_date: Optional[str] = None) -> np.ndarray:
+        """Boolean mask over the live rows; from_date/to_date are inclusive, like models.query_expenses."""
+        with self._lock:
+            m = np.ones(self.n, dtype=bool)
+            lo, hi = _ordinal(from_date), _ordinal(to_date)
+            if lo is not None:
+                m &= self.days[:self.n] >= lo
+            if hi is not None:
+                m &= self.days[:self.n] <= hi
+            return m
+
+    def per_category(self, mask: np.ndarray) -> Dict[str, Tuple[float, int]]:
+        with self._lock:
+            codes = self.codes[:self.n][mask]
+            # bincount aduna in float64: exact pentru bani cat timp totalul ramane sub 2**53
+            sums = np.bincount(codes, weights=self.cents[:self.n][mask], minlength=len(self.categories))
+            counts = np.bincount(codes, minlength=len(self.categories))
+        return {self.categories[c]: (int(sums[c]) / 100, int(counts[c])) for c in np.flatnonzero(counts)}
+
+    def per_day(self, mask: np.ndarray) -> Dict[str, float]:
+        with self._lock:
+            days, inverse = np.unique(self.days[:self.n][mask], return_inverse=True)
+            sums = np.bincount(inverse, weights=self.cents[:self.n][mask], minlength=len(days))
+        return {date.fromordinal(int(d)).isoformat(): int(v) / 100 for d, v in zip(days, sums)}
+
+    def total(self, mask: np.ndarray) -> float:
+        return self.total_cents(mask) / 100
+
+    def total_cents(self, mask: np.ndarray) -> int:
+        with self._lock:
+            return int(self.cents[:self.n][mask].sum())
+
+
+# ---------- per-user registry ----------
+_snapshots: Dict[int, ExpenseSnapshot] = {}
+_snapshots_lock = threading.Lock()
+# user_id -> nr. de scrieri (None -> resetari complete); un snapshot incarcat in paralel cu o scriere nu e pastrat
+_versions: Dict[Optional[int], int] = {}
+
+
+def get_snapshot(user_id: int) -> ExpenseSnapshot:
+    """The user's snapshot, loaded from the DB on first use and kept current by the expense listener."""
+    models.check_external_changes()
+    with _snapshots_lock:
+        snap = _snapshots.get(user_id)
+        if snap is not None:
+            return snap
+        version = (_versions.get(None, 0), _versions.get(user_id, 0))
+    snap = ExpenseSnapshot.load(user_id)
+    with _snapshots_lock:
+        if (_versions.get(None, 0), _versions.get(user_id, 0)) == version:
+            _snapshots.setdefault(user_id, snap)
+    return snap
+
+
+def clear_snapshots(user_id: Optional[int] = None) -> None:
+    with _snapshots_lock:
+        if user_id is None:
+            _snapshots.clear()
+        else:
+            _snapshots.pop(user_id, None)
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+
+
+def _on_expense_change(event: str, user_id: Optional[int], row: Optional[Tuple]) -> None:
+    with _snapshots_lock:
+        _versions[user_id] = _versions.get(user_id, 0) + 1
+        if user_id is None:
+            _snapshots.clear()  # alt proces a scris in baza
+            return
+        snap = _snapshots.get(user_id)
+        if snap is None:
+            return
+        if event == "reset":
+            # import in masa -> reincarcam la urmatoarea citire
+            del _snapshots[user_id]
+        elif event == "insert":
+            snap.insert(*row)
+        elif event == "update":
+            snap.update(*row)
+        elif event == "delete":
+            snap.delete(row[0])
+
+
+models.add_expense_listener(_on_expense_change)
+
+
+# ---------- Aggregates ----------
+def get_expense_summary(
+    user_id: int,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    ref: Optional[date] = None,
+    include_daily: bool = False,
+) -> dict:
+    """Same result as models.get_expense_summary, computed from the user's snapshot."""
+    payday, budget = models.get_user_settings(user_id)
+    start, end = models.get_cycle_bounds(payday, ref)
+    snap = get_snapshot(user_id)
+
+    with snap._lock:  # mastile raman valide doar pana la urmatorul patch
+        period = snap.mask(from_date, to_date)
+        total = snap.total(period)
+        per_category = snap.per_category(period)
+        per_day = snap.per_day(period) if include_daily else {}
+        cycle_cents = snap.total_cents(snap.mask(start.isoformat(), (end - timedelta(days=1)).isoformat()))
+    return {
+        "total": total,
+        "count": sum(n for _, n in per_category.values()),
+        "per_category": per_category,
+        "per_day": per_day,
+        "payday": payday,
+        "budget": budget,
+        "cycle_start": start,
+        "cycle_end": end,
+        "cycle_spent": cycle_cents / 100,
+        "cycle_remaining": (round(budget * 100) - cycle_cents) / 100,
+    }
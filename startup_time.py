@@ -0,0 +1,65 @@
+"""
+Masoara costul importurilor la pornirea aplicatiei (python -X importtime), per modul.
+
+    python startup_time.py            # top 20 module dupa timpul cumulat
+    python startup_time.py --json     # toate modulele, ca JSON (pentru comparatii intre rulari)
+    python startup_time.py --top 40 --module utils
+"""
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from typing import Dict, List
+
+
+def measure_imports(module: str = "app") -> List[Dict]:
+    """
+    Import `module` in a fresh interpreter with -X importtime and return one entry per
+    imported module: {"module", "self_us", "cumulative_us", "depth"}, in import order.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=here, capture_output=True, text=True,
+    )
+    if proc.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{proc.stderr.strip().splitlines()[-1]}")
+
+    entries = []
+    for line in proc.stderr.splitlines():
+        # "import time:       self [us] |  cumulative | imported package"
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        entries.append({
+            "module": name.strip(),
+            "self_us": int(self_us),
+            "cumulative_us": int(cumulative_us),
+            "depth": (len(name) - len(name.lstrip()) - 1) // 2,
+        })
+    return entries
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Per-module import cost at startup.")
+    parser.add_argument("--module", default="app", help="modulul importat (implicit: app)")
+    parser.add_argument("--top", type=int, default=20)
+    parser.add_argument("--json", action="store_true", help="scrie toate intrarile ca JSON")
+    args = parser.parse_args()
+
+    entries = measure_imports(args.module)
+    if args.json:
+        print(json.dumps({"module": args.module, "imports": entries}, indent=2))
+        return
+
+    total = next((e["cumulative_us"] for e in reversed(entries) if e["module"] == args.module), 0)
+    print(f"import {args.module}: {total / 1000:.1f} ms total")
+    for e in sorted(entries, key=lambda e: e["cumulative_us"], reverse=True)[:args.top]:
+        print(f"  {e['cumulative_us'] / 1000:8.1f} ms  (self {e['self_us'] / 1000:6.1f} ms)  {e['module']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,98 @@
+from __future__ import annotations
+
+from datetime import date, timedelta
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import models
+
+# granularitati suportate, de la cea mai fina la cea mai grosiera
+GRANULARITIES = ("day", "week", "month", "cycle")
+MAX_POINTS = 300  # buget de puncte pentru o serie desenata
+
+
+def choose_granularity(start: date, end: date, max_buckets: int = 120) -> str:
+    """Finest of day / ISO week / month that keeps [start, end] under `max_buckets` buckets."""
+    days = (end - start).days + 1
+    if days <= max_buckets:
+        return "day"
+    if days / 7 <= max_buckets:
+        return "week"
+    return "month"
+
+
+def bucket_start(d: date, granularity: str, payday: int = 1) -> date:
+    """First day of the bucket containing `d` (week = ISO week starting Monday; cycle = salary cycle)."""
+    if granularity == "day":
+        return d
+    if granularity == "week":
+        return d - timedelta(days=d.weekday())
+    if granularity == "month":
+        return d.replace(day=1)
+    if granularity == "cycle":
+        return models.get_cycle_bounds(payday, d)[0]
+    raise ValueError(f"Unknown granularity: {granularity}")
+
+
+def resample(per_day: Dict[str, float], granularity: str, payday: int = 1) -> List[Tuple[date, float]]:
+    """Sum a {YYYY-MM-DD: amount} mapping into buckets; returns [(bucket_start, total)] sorted by date."""
+    buckets: Dict[date, float] = {}
+    for day_str, amount in per_day.items():
+        key = bucket_start(date.fromisoformat(day_str), granularity, payday)
+        buckets[key] = buckets.get(key, 0.0) + float(amount)
+    return sorted(buckets.items())
+
+
+def lttb(points: Sequence[Tuple[float, float]], threshold: int) -> List[Tuple[float, float]]:
+    """
+    Largest-Triangle-Three-Buckets downsampling (Steinarsson, 2013): keeps the first and last
+    point and, from each of `threshold - 2` buckets, the point forming the largest triangle with
+    the previously kept point and the average of the next bucket. Preserves peaks and the shape.
+    """
+    n = len(points)
+    if threshold >= n or threshold < 3:
+        return list(points)
+
+    out = [points[0]]
+    every = (n - 2) / (threshold - 2)
+    a = 0
+    for i in range(threshold - 2):
+        # media bucket-ului urmator
+        nxt_start = int((i + 1) * every) + 1
+        nxt_end = min(int((i + 2) * every) + 1, n)
+        nxt = points[nxt_start:nxt_end] or [points[-1]]
+        avg_x = sum(p[0] for p in nxt) / len(nxt)
+        avg_y = sum(p[1] for p in nxt) / len(nxt)
+
+        ax, ay = points[a]
+        best, best_area = None, -1.0
+        for j in range(int(i * every) + 1, int((i + 1) * every) + 1):
+            px, py = points[j]
+            area = abs((ax - avg_x) * (py - ay) - (ax - px) * (avg_y - ay))
+            if area > best_area:
+                best, best_area = j, area
+        out.append(points[best])
+        a = best
+    out.append(points[-1])
+    return out
+
+
+def prepare_series(
+    per_day: Dict[str, float],
+    granularity: Optional[str] = None,
+    payday: int = 1,
+    max_points: int = MAX_POINTS,
+) -> Tuple[str, List[Tuple[date, float]]]:
+    """
+    Bucket a per-day series for plotting and cap it at `max_points` with LTTB.
+    granularity=None picks day/week/month from the date range. Returns (granularity, [(date, value)]).
+    """
+    if not per_day:
+        return granularity or "day", []
+    if granularity is None:
+        days = sorted(per_day)
+        granularity = choose_granularity(date.fromisoformat(days[0]), date.fromisoformat(days[-1]))
+    series = resample(per_day, granularity, payday)
+    if len(series) > max_points:
+        reduced = lttb([(d.toordinal(), v) for d, v in series], max_points)
+        series = [(date.fromordinal(int(x)), v) for x, v in reduced]
+    return granularity, series
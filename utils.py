@@ -1,48 +1,119 @@
 from __future__ import annotations
 
 import csv
+import json
+import threading
+import tkinter as tk
+from tkinter import ttk
 from datetime import date, datetime
-from typing import Optional, Iterable, Tuple, List
-
-import matplotlib
-matplotlib.use("TkAgg")  # backend pentru Tkinter
-import matplotlib.pyplot as plt
+from types import SimpleNamespace
+from typing import Optional, Callable, Iterator, List, TextIO, Tuple
 
 import models
+import timeseries
 
+# matplotlib se incarca doar la primul grafic (sau in fundal, prin prewarm_charts)
+_mpl = None
+_mpl_lock = threading.Lock()
 
-# ============== Utilitare interne ==============
-def _iter_expenses(
-    user_id: int,
-    from_date: Optional[str] = None,
-    to_date: Optional[str] = None
-) -> Iterable[Tuple[int, int, float, str, str, str]]:
+
+def _matplotlib() -> SimpleNamespace:
     """
-    Itereaza cheltuielile userului, optional filtrate intre from_date si to_date (string YYYY-MM-DD).
-    Returnează tuple: (id, user_id, amount, category, date, description)
+    Import the matplotlib pieces used by the chart panels on first use.
+    Figures are created directly (no pyplot), so nothing is kept in a global figure registry.
     """
-    rows = models.get_all_expenses(user_id)
-    for r in rows:
-        # r: (id, user_id, amount, category, date, description)
-        if from_date and r[4] < from_date:
-            continue
-        if to_date and r[4] > to_date:
-            continue
-        yield r
+    global _mpl
+    if _mpl is None:
+        with _mpl_lock:
+            if _mpl is None:
+                from matplotlib.figure import Figure
+                from matplotlib.backends.backend_tkagg import FigureCanvasTkAgg
+                import matplotlib.dates as mdates
+                _mpl = SimpleNamespace(Figure=Figure, FigureCanvasTkAgg=FigureCanvasTkAgg, dates=mdates)
+    return _mpl
+
+
+def prewarm_charts() -> None:
+    """Import the plotting stack in a background thread, so the first chart opens fast."""
+    if _mpl is None:
+        threading.Thread(target=_matplotlib, name="charts-prewarm", daemon=True).start()
+
+
+# ============== Analize (snapshot NumPy) ==============
+_snapshot = None
+
+
+def _snapshots():
+    """The snapshot module, imported on first use; None when numpy is not installed."""
+    global _snapshot
+    if _snapshot is None:
+        try:
+            import snapshot
+        except ImportError:
+            snapshot = False
+        _snapshot = snapshot
+    return _snapshot or None
+
+
+def expense_summary(
+    user_id: int,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    include_daily: bool = False,
+) -> dict:
+    """models.get_expense_summary, computed from the user's in-memory columnar snapshot when numpy is available."""
+    snap = _snapshots()
+    if snap is None:
+        return models.get_expense_summary(user_id, from_date, to_date, include_daily=include_daily)
+    return snap.get_expense_summary(user_id, from_date, to_date, include_daily=include_daily)
+
+
+def release_snapshots() -> None:
+    """Drop every loaded snapshot (on logout)."""
+    if _snapshot:
+        _snapshot.clear_snapshots()
 
 
 # ============== Exporturi ==============
+CSV_BUFFER_SIZE = 1 << 16
+
+
 def export_csv(
     user_id: int,
     path: str,
     from_date: Optional[str] = None,
-    to_date: Optional[str] = None
-) -> None:
-    with open(path, "w", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        writer.writerow(["ID", "Amount", "Category", "Date", "Description"])
-        for r in _iter_expenses(user_id, from_date, to_date):
-            writer.writerow([r[0], f"{r[2]:.2f}", r[3], r[4], r[5]])
+    to_date: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    chunk_size: int = 1000,
+) -> int:
+    """
+    Scrie CSV-ul in flux: randurile vin din DB in bucati de `chunk_size` si sunt scrise
+    printr-un buffer, deci memoria nu creste cu istoricul.
+    progress(done, total) e apelat dupa fiecare bucata. Returnează numarul de randuri scrise.
+    """
+    with open(path, "w", newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE) as f:
+        return write_csv(user_id, f, from_date, to_date, progress, chunk_size)
+
+
+def write_csv(
+    user_id: int,
+    f: TextIO,
+    from_date: Optional[str] = None,
+    to_date: Optional[str] = None,
+    progress: Optional[Callable[[int, int], None]] = None,
+    chunk_size: int = 1000,
+) -> int:
+    """export_csv into an open text stream (file, HTTP response, ...); returns the number of rows."""
+    total = models.count_expenses(user_id, None, from_date, to_date) if progress else 0
+    done = 0
+    writer = csv.writer(f)
+    writer.writerow(["ID", "Amount", "Category", "Date", "Description"])
+    for chunk in models.iter_expense_chunks(user_id, from_date, to_date, chunk_size):
+        writer.writerows([r[0], f"{r[2]:.2f}", r[3], r[4], r[5]] for r in chunk)
+        done += len(chunk)
+        if progress:
+            progress(done, total)
+    return done
 
 
 def export_txt_summary(
@@ -51,145 +122,284 @@ def export_txt_summary(
     from_date: Optional[str] = None,
     to_date: Optional[str] = None
 ) -> None:
-    # sum pe total și pe categorie
-    total = 0.0
-    per_cat = {}
-    rows = list(_iter_expenses(user_id, from_date, to_date))
-    for _, _, amount, cat, _, _ in rows:
-        total += float(amount)
-        per_cat[cat] = per_cat.get(cat, 0.0) + float(amount)
-
-    remaining, spent, start, end = models.get_cycle_remaining(user_id)
     with open(path, "w", encoding="utf-8") as f:
-        f.write("Expense Report\n")
-        f.write("=================\n")
-        if from_date or to_date:
-            f.write(f"Period: {from_date or '-∞'} .. {to_date or '+∞'}\n")
-        f.write(f"Generated at: {datetime.now().isoformat(sep=' ', timespec='seconds')}\n\n")
-        f.write(f"Total expenses: {total:.2f}\n\n")
-        f.write("By category:\n")
-        for cat, val in sorted(per_cat.items(), key=lambda x: x[0].lower()):
-            f.write(f"  - {cat}: {val:.2f}\n")
-        f.write("\n")
-        f.write(f"Current salary cycle: {start.isoformat()} → {end.isoformat()} (end exclusive)\n")
-        f.write(f"Spent in cycle: {spent:.2f}\n")
-        f.write(f"Remaining in cycle: {remaining:.2f}\n")
-
-
-# ============== Grafice de bază ==============
-def show_graph_window(
-    parent,
+        write_txt_summary(user_id, f, from_date, to_date)
+
+
+def write_txt_summary(
     user_id: int,
+    f: TextIO,
     from_date: Optional[str] = None,
-    to_date: Optional[str] = None
+    to_date: Optional[str] = None,
+    summary: Optional[dict] = None,
 ) -> None:
+    # totalurile (pe perioada, pe categorie si pe ciclu) vin din snapshot-ul coloanar sau din rollup;
+    # `summary` deja calculat (ex. server.py, din models.get_expense_summary) are prioritate
+    if summary is None:
+        summary = expense_summary(user_id, from_date, to_date)
+    total = summary["total"]
+    per_cat = {cat: val for cat, (val, _n) in summary["per_category"].items()}
+    remaining, spent = summary["cycle_remaining"], summary["cycle_spent"]
+    start, end = summary["cycle_start"], summary["cycle_end"]
+    f.write("Expense Report\n")
+    f.write("=================\n")
+    if from_date or to_date:
+        f.write(f"Period: {from_date or '-∞'} .. {to_date or '+∞'}\n")
+    f.write(f"Generated at: {datetime.now().isoformat(sep=' ', timespec='seconds')}\n\n")
+    f.write(f"Total expenses: {total:.2f}\n\n")
+    f.write("By category:\n")
+    for cat, val in sorted(per_cat.items(), key=lambda x: x[0].lower()):
+        f.write(f"  - {cat}: {val:.2f}\n")
+    f.write("\n")
+    f.write(f"Current salary cycle: {start.isoformat()} → {end.isoformat()} (end exclusive)\n")
+    f.write(f"Spent in cycle: {spent:.2f}\n")
+    f.write(f"Remaining in cycle: {remaining:.2f}\n")
+
+
+# ============== Importuri ==============
+def _iter_csv_rows(path: str) -> Iterator[Tuple[str, str, str, str]]:
+    """Citeste in flux un CSV cu aceleasi coloane ca export_csv (ID-ul e ignorat)."""
+    with open(path, newline="", encoding="utf-8", buffering=CSV_BUFFER_SIZE) as f:
+        for r in csv.DictReader(f):
+            yield r.get("Amount"), r.get("Category"), r.get("Date"), r.get("Description") or ""
+
+
+def _iter_jsonl_rows(path: str) -> Iterator[Tuple[str, str, str, str]]:
+    """Un obiect JSON pe linie; cheile ca in CSV ("Amount", ...) sau cu litere mici ("amount", ...)."""
+    with open(path, encoding="utf-8", buffering=CSV_BUFFER_SIZE) as f:
+        for line in f:
+            if not line.strip():
+                continue
+            obj = {k.lower(): v for k, v in json.loads(line).items()}
+            yield obj.get("amount"), obj.get("category"), obj.get("date"), obj.get("description") or ""
+
+
+def import_expenses(
+    user_id: int,
+    path: str,
+    progress: Optional[Callable[[int], None]] = None,
+    batch_size: int = 5000,
+) -> int:
+    """
+    Importa cheltuieli dintr-un .csv (format export_csv) sau .jsonl, intr-o singura tranzactie.
+    Fisierul e citit in flux, deci memoria nu depinde de marimea lui. Returnează nr. de randuri.
+    """
+    rows = _iter_jsonl_rows(path) if path.lower().endswith((".jsonl", ".json")) else _iter_csv_rows(path)
+    return models.add_expenses_bulk(user_id, rows, batch_size=batch_size, progress=progress)
+
+
+# ============== Grafice (panouri incorporate, reutilizate) ==============
+class _ChartPanel(tk.Frame):
+    """
+    Frame with one persistent Figure + FigureCanvasTkAgg.
+    Subclasses create their artists once in _setup() and later only change their data,
+    then ask for a single redraw (draw_idle). The figure is cleared when the panel is destroyed.
+    """
+
+    figsize = (9.0, 4.5)
+
+    def __init__(self, master):
+        super().__init__(master)
+        mpl = _matplotlib()
+        self.mpl = mpl
+        self.figure = mpl.Figure(figsize=self.figsize)
+        self.canvas = mpl.FigureCanvasTkAgg(self.figure, master=self)
+        self.canvas.get_tk_widget().pack(fill="both", expand=True)
+        # mesaj afisat peste grafic cand nu exista date
+        self.message = self.figure.text(0.5, 0.5, "", ha="center", va="center", fontsize=12)
+        self._setup()
+        self.bind("<Destroy>", self._on_destroy)
+
+    def _setup(self) -> None:
+        raise NotImplementedError
+
+    def _on_destroy(self, event) -> None:
+        if event.widget is self:
+            self.close()
+
+    def close(self) -> None:
+        """Release the figure explicitly (artists, axes, renderer cache)."""
+        self.figure.clear()
+
+    def _set_message(self, text: str) -> None:
+        self.message.set_text(text)
+        for ax in self.figure.axes:
+            ax.set_visible(not text)
+
+
+class ExpenseChartsPanel(_ChartPanel):
     """
-    2 grafice:
+    2 grafice în aceeași figură:
       1) Cheltuieli pe categorii (bar)
-      2) Cheltuieli pe zile (linie)
+      2) Cheltuieli în timp (linie), grupate pe zi / săptămână / lună / ciclu de salariu
+         și reduse cu LTTB la cel mult timeseries.MAX_POINTS puncte
     """
-    rows = list(_iter_expenses(user_id, from_date, to_date))
-    if not rows:
-        _alert_no_data(parent, "Nu există cheltuieli pentru intervalul selectat.")
-        return
-
-    # sum pe categorie și pe zile
-    per_cat = {}
-    per_day = {}
-    for _, _, amount, cat, d, _ in rows:
-        per_cat[cat] = per_cat.get(cat, 0.0) + float(amount)
-        per_day[d] = per_day.get(d, 0.0) + float(amount)
-
-    # fig 1: categorii
-    fig1 = plt.figure(figsize=(6.5, 4.2))
-    fig1.canvas.manager.set_window_title("Cheltuieli pe categorii")
-    cats = list(per_cat.keys())
-    vals = [per_cat[c] for c in cats]
-    plt.bar(cats, vals)
-    plt.title("Cheltuieli pe categorii")
-    plt.xlabel("Categorie")
-    plt.ylabel("RON")
-    plt.xticks(rotation=20)
-    plt.tight_layout()
-
-    # fig 2: pe zile (ordonăm după dată)
-    fig2 = plt.figure(figsize=(7.2, 4.2))
-    fig2.canvas.manager.set_window_title("Cheltuieli pe zile")
-    days = sorted(per_day.keys())
-    dvals = [per_day[d] for d in days]
-    plt.plot(days, dvals, marker="o")
-    plt.title("Cheltuieli pe zile")
-    plt.xlabel("Dată")
-    plt.ylabel("RON")
-    plt.xticks(rotation=30)
-    plt.tight_layout()
-
-    plt.show(block=False)
-
-
-def _alert_no_data(parent, msg: str):
-    import tkinter.messagebox as mb
-    mb.showinfo("Info", msg)
+
+    GRANULARITY_LABELS = {"Auto": None, "Day": "day", "Week": "week", "Month": "month", "Salary cycle": "cycle"}
+    TITLES = {"day": "Cheltuieli pe zile", "week": "Cheltuieli pe săptămâni",
+              "month": "Cheltuieli pe luni", "cycle": "Cheltuieli pe cicluri de salariu"}
+
+    def _setup(self) -> None:
+        bar = tk.Frame(self)
+        bar.pack(side="top", fill="x", before=self.canvas.get_tk_widget())
+        tk.Label(bar, text="Group by").pack(side="left", padx=(6, 2))
+        self.granularity_cb = ttk.Combobox(bar, values=list(self.GRANULARITY_LABELS), state="readonly", width=12)
+        self.granularity_cb.set("Auto")
+        self.granularity_cb.pack(side="left")
+        # schimbarea granularitatii redeseneaza din ultimul sumar, fara interogare noua
+        self.granularity_cb.bind("<<ComboboxSelected>>", lambda _e: self._draw_series())
+        self.summary: Optional[dict] = None
+
+        self.ax_cat, self.ax_day = self.figure.subplots(1, 2, gridspec_kw={"width_ratios": [1, 1.3]})
+        self.figure.subplots_adjust(left=0.07, right=0.98, bottom=0.22, top=0.9, wspace=0.25)
+        self.bars = None
+        self.categories: tuple = ()
+
+        self.ax_cat.set_title("Cheltuieli pe categorii")
+        self.ax_cat.set_xlabel("Categorie")
+        self.ax_cat.set_ylabel("RON")
+
+        (self.line,) = self.ax_day.plot([], [], marker="o")
+        self.ax_day.set_title(self.TITLES["day"])
+        self.ax_day.set_xlabel("Dată")
+        self.ax_day.set_ylabel("RON")
+        locator = self.mpl.dates.AutoDateLocator()
+        self.ax_day.xaxis.set_major_locator(locator)
+        self.ax_day.xaxis.set_major_formatter(self.mpl.dates.ConciseDateFormatter(locator))
+
+    def show_summary(self, summary: dict) -> None:
+        """Redraw from models.get_expense_summary(..., include_daily=True)."""
+        self.summary = summary
+        if not summary["count"]:
+            self._set_message("Nu există cheltuieli pentru intervalul selectat.")
+            self.canvas.draw_idle()
+            return
+        self._set_message("")
+
+        per_cat = {cat: val for cat, (val, _n) in summary["per_category"].items()}
+        cats = tuple(sorted(per_cat, key=str.lower))
+        vals = [per_cat[c] for c in cats]
+        if cats == self.categories:
+            for rect, val in zip(self.bars, vals):
+                rect.set_height(val)
+        else:
+            # alt set de categorii -> refacem doar barele
+            if self.bars is not None:
+                self.bars.remove()
+            self.bars = self.ax_cat.bar(range(len(cats)), vals, color="C0")
+            self.ax_cat.set_xticks(range(len(cats)))
+            self.ax_cat.set_xticklabels(cats, rotation=20)
+            self.categories = cats
+        self.ax_cat.set_ylim(0, max(vals + [1.0]) * 1.1)
+        self._draw_series()
+
+    def _draw_series(self) -> None:
+        if not self.summary or not self.summary["count"]:
+            return
+        wanted = self.GRANULARITY_LABELS[self.granularity_cb.get()]
+        granularity, series = timeseries.prepare_series(
+            self.summary["per_day"], wanted, payday=self.summary["payday"]
+        )
+        xs = self.mpl.dates.date2num([d for d, _ in series])
+        self.line.set_data(xs, [v for _, v in series])
+        self.line.set_marker("o" if len(series) <= 60 else "")
+        self.ax_day.set_title(self.TITLES[granularity])
+        self.ax_day.relim()
+        self.ax_day.autoscale_view()
+        self.canvas.draw_idle()
 
 
 # ============== Grafic: Remaining vs Zile rămase ==============
-def show_remaining_vs_days(parent, user_id: int) -> None:
+class RemainingChartPanel(_ChartPanel):
     """
     Grafic clar, fără suprapuneri:
       - două bare side-by-side pe aceeași axă X:
           [Remaining (RON)] și [Days left]
       - etichete de valori desenate direct pe fiecare bară (în interior sau deasupra dacă e prea mică)
     """
-    remaining, spent, start, end = models.get_cycle_remaining(user_id)
-    today = date.today()
-    days_left = max(0, (end - today).days)  # end este exclusiv
 
+    figsize = (7.5, 4.8)
     labels = ["Remaining (RON)", "Days left"]
-    values = [max(0.0, float(remaining)), float(days_left)]
-
-    # Figură mai lată + margin sus pentru etichete deasupra
-    fig = plt.figure(figsize=(7.5, 4.8))
-    fig.canvas.manager.set_window_title("Remaining vs Days")
-    ax = plt.gca()
-
-    bars = ax.bar(labels, values)
-    ax.set_title(
-        f"Cycle: {start.isoformat()} → {end.isoformat()}  |  Spent: {float(spent):.2f} RON"
-    )
-    ax.set_ylabel("Values (RON / days)")
-
-    # Stabilim un y_max cu puțin headroom pentru etichete
-    y_max = max(values + [1.0]) * 1.25
-    ax.set_ylim(0, y_max)
-
-    # Etichete pe bare (folosim indexul barei pentru a ști ce format aplicăm)
-    for i, (rect, val) in enumerate(zip(bars, values)):
-        height = rect.get_height()
-        label = labels[i]
-        text = f"{int(val)}" if label == "Days left" else f"{val:.2f}"
-
-        # Dacă bara e suficient de înaltă, afișăm textul în interior (alb), altfel deasupra (negru)
-        if height > 0.18 * y_max:
-            ax.text(
-                rect.get_x() + rect.get_width() / 2,
-                height * 0.55,
-                text,
-                ha="center",
-                va="center",
-                color="white",
-                fontsize=11,
-            )
+
+    def _setup(self) -> None:
+        self.ax = self.figure.subplots()
+        self.figure.subplots_adjust(left=0.1, right=0.97, bottom=0.1, top=0.88)
+        self.bars = self.ax.bar(self.labels, [0.0, 0.0])
+        self.ax.set_ylabel("Values (RON / days)")
+        self.value_texts = [
+            self.ax.text(rect.get_x() + rect.get_width() / 2, 0, "", ha="center", fontsize=11)
+            for rect in self.bars
+        ]
+
+    def show_cycle(self, cycle: Tuple[float, float, date, date]) -> None:
+        """Redraw from models.get_cycle_remaining(...) -> (remaining, spent, start, end)."""
+        remaining, spent, start, end = cycle
+        days_left = max(0, (end - date.today()).days)  # end este exclusiv
+        values = [max(0.0, float(remaining)), float(days_left)]
+
+        self.ax.set_title(
+            f"Cycle: {start.isoformat()} → {end.isoformat()}  |  Spent: {float(spent):.2f} RON"
+        )
+        # Stabilim un y_max cu puțin headroom pentru etichete
+        y_max = max(values + [1.0]) * 1.25
+        self.ax.set_ylim(0, y_max)
+
+        for rect, txt, label, val in zip(self.bars, self.value_texts, self.labels, values):
+            rect.set_height(val)
+            txt.set_text(f"{int(val)}" if label == "Days left" else f"{val:.2f}")
+            # Dacă bara e suficient de înaltă, afișăm textul în interior (alb), altfel deasupra (negru)
+            if val > 0.18 * y_max:
+                txt.set_y(val * 0.55)
+                txt.set_va("center")
+                txt.set_color("white")
+            else:
+                txt.set_y(val + 0.03 * y_max)
+                txt.set_va("bottom")
+                txt.set_color("black")
+        self.canvas.draw_idle()
+
+
+# ============== Grafic: Istoric cicluri de salariu ==============
+class CycleHistoryChartPanel(_ChartPanel):
+    """
+    Cheltuit vs buget pentru ultimele N cicluri de salariu:
+      - o bară per ciclu (roșie dacă bugetul a fost depășit)
+      - linie orizontală la nivelul bugetului
+    """
+
+    def _setup(self) -> None:
+        self.ax = self.figure.subplots()
+        self.figure.subplots_adjust(left=0.08, right=0.98, bottom=0.2, top=0.88)
+        self.bars = None
+        self.budget_line = self.ax.axhline(0.0, color="C1", linestyle="--", label="Budget")
+        self.ax.set_title("Spent per salary cycle")
+        self.ax.set_ylabel("RON")
+
+    def show_history(self, history: List[Tuple[date, date, float, float, float]]) -> None:
+        """Redraw from models.get_cycle_history(...) -> [(start, end, spent, budget, remaining)]."""
+        if not history:
+            self._set_message("Nu există cicluri de afișat.")
+            self.canvas.draw_idle()
+            return
+        self._set_message("")
+
+        labels = [start.strftime("%d %b %y") for start, *_ in history]
+        spent = [s for _start, _end, s, _b, _r in history]
+        budget = history[-1][3]
+        colors = ["C3" if budget and s > budget else "C0" for s in spent]
+        if self.bars is not None and len(self.bars) == len(spent):
+            for rect, val, color in zip(self.bars, spent, colors):
+                rect.set_height(val)
+                rect.set_color(color)
         else:
-            ax.text(
-                rect.get_x() + rect.get_width() / 2,
-                height + 0.03 * y_max,
-                text,
-                ha="center",
-                va="bottom",
-                color="black",
-                fontsize=11,
-            )
-
-    ax.margins(y=0.1)
-    plt.tight_layout()
-    plt.show(block=False)
+            if self.bars is not None:
+                self.bars.remove()
+            self.bars = self.ax.bar(range(len(spent)), spent, color=colors)
+            self.ax.set_xticks(range(len(spent)))
+        self.ax.set_xticklabels(labels, rotation=30)
+        self.budget_line.set_ydata([budget, budget])
+        self.budget_line.set_visible(budget > 0)
+        over = sum(1 for s in spent if budget and s > budget)
+        self.ax.set_title(f"Spent per salary cycle  |  budget {budget:.2f} RON, exceeded in {over}/{len(spent)}")
+        self.ax.set_ylim(0, max(spent + [budget, 1.0]) * 1.15)
+        self.canvas.draw_idle()
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+import itertools
+import queue
+import sqlite3
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Callable, Dict, Optional, Tuple
+
+import database
+
+
+class BackgroundWorker:
+    """
+    Runs database / export / aggregation jobs on a thread pool so the Tk mainloop never blocks.
+    Results are handed back on the UI thread by polling a queue with `root.after`.
+
+    Jobs are submitted under a key ("expenses", "badge", ...); a new job with the same key
+    supersedes the previous one: it is cancelled if not started yet, otherwise its result is dropped
+    and, if it is interruptible, its running SQL is stopped with Connection.interrupt().
+    Key None = a one-off job (e.g. a write) that nothing supersedes.
+    """
+
+    POLL_MS = 30
+
+    def __init__(self, root, max_workers: int = 3, on_busy: Optional[Callable[[bool], None]] = None):
+        self.root = root
+        self.on_busy = on_busy
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="expense-worker")
+        self._ui_calls: "queue.SimpleQueue[Callable[[], None]]" = queue.SimpleQueue()
+        self._generations: Dict[str, int] = {}
+        self._futures: Dict[str, Future] = {}
+        self._running: Dict[str, Tuple[int, sqlite3.Connection]] = {}  # key -> (generatie, conexiunea job-ului)
+        self._running_lock = threading.Lock()
+        self._uninterruptible: set = set()  # viitorii job-urilor interruptible=False inca nerezolvati
+        self._one_off = itertools.count(1)
+        self._pending = 0
+        self._polling = False
+        self._closed = False
+
+    # ----- API (UI thread) -----
+    def submit(self, key: Optional[str], fn: Callable, *args, on_done: Optional[Callable] = None,
+               on_error: Optional[Callable[[BaseException], None]] = None,
+               interruptible: bool = True, **kwargs) -> Optional[Future]:
+        """
+        Run fn(*args, **kwargs) in the pool. Pass interruptible=False for jobs that must run to
+        the end once started (imports, file exports): superseding them only drops the result.
+        """
+        if self._closed:
+            return None
+        if key is None:
+            key = f"#{next(self._one_off)}"
+        gen = self._generations.get(key, 0) + 1
+        self._generations[key] = gen
+        prev = self._futures.get(key)
+        if prev is not None:
+            prev.cancel()
+            self._interrupt(key)
+
+        self._set_pending(self._pending + 1)
+        job = self._tracked(key, gen, fn) if interruptible else fn
+        future = self._executor.submit(job, *args, **kwargs)
+        self._futures[key] = future
+        if not interruptible:
+            self._uninterruptible.add(future)
+        future.add_done_callback(lambda f: self._ui_calls.put(lambda: self._finish(key, gen, f, on_done, on_error)))
+        self._schedule_poll()
+        return future
+
+    def post(self, fn: Callable, *args) -> None:
+        """Run fn(*args) on the UI thread (safe to call from a job, e.g. for progress updates)."""
+        self._ui_calls.put(lambda: fn(*args))
+
+    def cancel(self, key: str) -> None:
+        """Drop the result of the job in flight under `key` (interrupting it if it runs)."""
+        self._generations[key] = self._generations.get(key, 0) + 1
+        fut = self._futures.pop(key, None)
+        if fut is not None:
+            fut.cancel()
+            self._interrupt(key)
+
+    def cancel_all(self) -> None:
+        """
+        Drop the results of every interruptible job in flight (e.g. on logout).
+        interruptible=False jobs keep running and still report their result or error.
+        """
+        for key in list(self._generations):
+            if self._futures.get(key) not in self._uninterruptible:
+                self.cancel(key)
+
+    def has_uninterruptible(self) -> bool:
+        """True while an interruptible=False job (import, export, write) is queued or running."""
+        return bool(self._uninterruptible)
+
+    def shutdown(self) -> None:
+        self._closed = True
+        self.cancel_all()
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    # ----- internals -----
+    def _tracked(self, key: str, gen: int, fn: Callable) -> Callable:
+        """Wrap fn so that, while it runs, its thread's connection can be interrupted by _interrupt(key)."""
+        def run(*args, **kwargs):
+            with self._running_lock:
+                if self._generations.get(key) != gen:
+                    raise sqlite3.OperationalError("interrupted")  # inlocuit inainte sa porneasca
+                self._running[key] = (gen, database.get_connection())
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                with self._running_lock:
+                    if self._running.get(key, (None,))[0] == gen:
+                        del self._running[key]
+        return run
+
+    def _interrupt(self, key: str) -> None:
+        # sub lock: job-ul nu poate termina intre timp, deci interrupt() nu atinge job-ul urmator
+        # de pe aceeasi conexiune (fara instructiuni in lucru, interrupt() nu are efect)
+        with self._running_lock:
+            running = self._running.get(key)
+            if running is not None and running[0] != self._generations.get(key):
+                try:
+                    running[1].interrupt()
+                except sqlite3.ProgrammingError:
+                    pass  # conexiune deja inchisa; job-ul a esuat oricum
+
+    def _finish(self, key, gen, future: Future, on_done, on_error) -> None:
+        if self._futures.get(key) is future:
+            del self._futures[key]
+        self._uninterruptible.discard(future)
+        try:
+            if future.cancelled() or self._generations.get(key) != gen or self._closed:
+                return  # inlocuit de o cerere mai noua
+            exc = future.exception()
+            if exc is not None:
+                if on_error:
+                    on_error(exc)
+                else:
+                    from tkinter import messagebox
+                    messagebox.showerror("Error", str(exc))
+            elif on_done:
+                on_done(future.result())
+        finally:
+            if key.startswith("#"):
+                self._generations.pop(key, None)
+            self._set_pending(self._pending - 1)
+
+    def _set_pending(self, n: int) -> None:
+        was_busy, self._pending = self._pending > 0, n
+        if self.on_busy and was_busy != (n > 0):
+            self.on_busy(n > 0)
+
+    def _schedule_poll(self) -> None:
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.POLL_MS, self._poll)
+
+    def _poll(self) -> None:
+        while True:
+            try:
+                call = self._ui_calls.get_nowait()
+            except queue.Empty:
+                break
+            try:
+                call()
+            except Exception as e:  # un callback stricat nu trebuie sa opreasca polling-ul
+                print(f"Background callback failed: {e}")
+        if self._pending > 0 and not self._closed:
+            self.root.after(self.POLL_MS, self._poll)
+        else:
+            self._polling = False
+            # apeluri post() venite fara job-uri in lucru
+            if not self._ui_calls.empty() and not self._closed:
+                self._schedule_poll()